@@ -1,31 +1,107 @@
-import os, yaml, pandas as pd, streamlit as st
+import os, perf, time, uuid, yaml, pandas as pd, streamlit as st
 from typing import Dict, List, Any
-from fetch import recent_articles_for_market
-from llm import analyse_article
-from ui import article_card
+from feedstream import parse_stats
+from fetch import fetch_annotated, FeedUnavailable, FETCH_WORKERS
+from insights import generate_insights
+from keywords import compile_keywords
+from llm import analyse_article_safe, analyse_batch, input_token_stats, LLM_BATCH_SIZE, LLM_CONCURRENCY
+from pipeline import stream_articles
+from prefilter import load_prefilter
+from store import get_store
+from ui import inject_card_css, render_cards, render_card_pages
+from utils import cache_stats
 import datetime as dt
-from dateutil import parser
 import re
 
 st.set_page_config(page_title="Regulatory News (LLM)", layout="wide")
 
 st.title("NBIM Regulatory News — LLM Dashboard")
+inject_card_css()
 
 if "df" not in st.session_state:
     st.session_state["df"] = None
+if "cards" not in st.session_state:
+    st.session_state["cards"] = None
+
+# Streamlit reruns this script on every widget change, so each stage is memoized on its inputs
+FEED_MEMO_TTL = int(os.environ.get("FEED_MEMO_TTL", "600"))    # seconds a fetched feed is reused
+
+@st.cache_data(show_spinner=False)
+def load_yaml(path: str, mtime: float) -> Dict[str, Any]:
+    # mtime is part of the key so edited configs are picked up
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+@st.cache_data(ttl=FEED_MEMO_TTL, show_spinner=False, max_entries=2000)
+def _fetch_feed_memo(url: str, direct: bool) -> List[Dict[str, Any]]:
+    # Called from the pipeline's fetch threads; every caller gets its own copy of the items.
+    # No filter values in the key: the date range is applied by _accept, so changing it reuses the fetch
+    return fetch_annotated(url, direct, raise_errors=True)
+
+def fetch_feed_memo(url: str, direct: bool) -> List[Dict[str, Any]]:
+    # A raised call is not memoized, so a failed fetch shows the last cached entries and is retried next run
+    try:
+        return _fetch_feed_memo(url, direct)
+    except FeedUnavailable as e:
+        return e.items
+
+@st.cache_data(ttl=30, show_spinner=False)
+def store_stats() -> Dict[str, Any]:
+    return get_store().stats()
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def csv_export(run_id: str, _df: pd.DataFrame) -> bytes:
+    # Keyed by run: the frame itself is not hashed
+    return _df.to_csv(index=False).encode("utf-8")
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def aggregates(run_id: str, _df: pd.DataFrame) -> Dict[str, Any]:
+    total = len(_df)
+    reg = int(_df["is_regulatory"].fillna(False).astype(bool).sum()) if "is_regulatory" in _df else 0
+    authority = _df["authority"].dropna() if "authority" in _df else pd.Series(dtype=object)
+    jurisdiction = _df["jurisdiction"].dropna() if "jurisdiction" in _df else pd.Series(dtype=object)
+    published = _df["published_utc"].dropna() if "published_utc" in _df else pd.Series(dtype="datetime64[ns, UTC]")
+    return {
+        "total": total,
+        "regulatory": reg,
+        "perc_regulatory": reg / total * 100 if total else 0,
+        "top_authority": authority.value_counts().idxmax() if not authority.empty else "N/A",
+        "by_jurisdiction": jurisdiction.value_counts().rename_axis("jurisdiction").reset_index(name="count"),
+        "timeline": (published.to_frame().groupby(pd.Grouper(key="published_utc", freq="MS")).size()
+                     .reset_index(name="count")) if not published.empty else None,
+    }
 
 # Loading config
-with open("config/markets.yaml", "r", encoding="utf-8") as f:
-    markets_cfg = yaml.safe_load(f)
-with open("config/sources.yaml", "r", encoding="utf-8") as f:
-    sources_cfg = yaml.safe_load(f)
+markets_cfg = load_yaml("config/markets.yaml", os.path.getmtime("config/markets.yaml"))
+sources_cfg = load_yaml("config/sources.yaml", os.path.getmtime("config/sources.yaml"))
 
 # Sidebar controls
+STORE_MODE = "Read from store"
+data_source = st.sidebar.radio("Data source", ["Live fetch", STORE_MODE], horizontal=True)
+from_store = data_source == STORE_MODE
+if from_store:
+    _ss = store_stats()
+    _last = dt.datetime.fromtimestamp(_ss["last_seen"]).strftime("%Y-%m-%d %H:%M") if _ss["last_seen"] else "never"
+    st.sidebar.caption(
+        f"Store: {_ss['articles']} articles, {_ss['classified']} classified, last ingest {_last}. "
+        "Fill it with `python ingest.py`."
+    )
 all_markets: List[str] = markets_cfg.get("markets", [])
 selected = st.sidebar.multiselect("Select markets", options=all_markets, default=all_markets)
 max_items = st.sidebar.slider("Max items per market", min_value=5, max_value=60, value=20, step=5)
+page_size = st.sidebar.slider("Cards per page", min_value=5, max_value=50, value=10, step=5)
 run_llm = st.sidebar.checkbox("Run LLM classification/summaries", value=True)
 model = st.sidebar.selectbox("LLM model", ["gpt-4.1-mini", "gpt-4o-mini", "o4-mini"], index=0)
+fetch_workers = st.sidebar.slider("Concurrent feed fetches", min_value=1, max_value=32, value=FETCH_WORKERS)
+llm_workers = st.sidebar.slider("Concurrent LLM calls", min_value=1, max_value=32, value=LLM_CONCURRENCY)
+llm_batch = st.sidebar.slider("Articles per LLM request", min_value=1, max_value=20, value=LLM_BATCH_SIZE)
+if st.sidebar.button("Refetch feeds", help=f"Fetched feeds are reused for {FEED_MEMO_TTL // 60} minutes across runs"):
+    _fetch_feed_memo.clear()
+prefilter = load_prefilter()
+prefilter_threshold = st.sidebar.slider(
+    "Pre-filter threshold (0 = send everything to the LLM)",
+    min_value=0.0, max_value=0.9, value=prefilter.threshold, step=0.05,
+)
 
 # Date range filter
 st.sidebar.markdown("### Date Range Filter")
@@ -51,131 +127,229 @@ keyword_raw = st.sidebar.text_input(
     placeholder="e.g., crypto, MiCA, ESG, Finanstilsynet"
 )
 st.sidebar.caption("Tip: Increasing 'Max items per market' may improve keyword match results.")
+if from_store:
+    st.sidebar.caption('Store search: `crypt*` matches prefixes, `"market abuse"` matches a phrase.')
 
-# Typos/Synonyms -> keyword 
+# Typos/Synonyms -> keyword, compiled once into a single-pass matcher (config/keywords.yaml)
 keyword_list = [k.strip().lower() for k in re.split(r'[;,]', keyword_raw) if k.strip()]
-expanded_keywords = set()
-synonyms = {
-    "crypto": ["crypto", "cryptocurrency", "digital asset", "virtual asset", "mica"],
-    "esg": ["esg", "sustainability", "sustainable finance", "csrd", "taxonomy", "sfdr"],
-    "crpto": ["crypto"]  
-}
-for k in keyword_list:
-    if k in synonyms:
-        expanded_keywords.update(synonyms[k])
-    else:
-        expanded_keywords.add(k)
+keyword_matcher, keyword_synonyms = compile_keywords(tuple(keyword_list))
+expanded_keywords = {t for terms in keyword_synonyms.values() for t in terms}
+# One synonym group per keyword for the store's full-text search
+keyword_groups = list(keyword_synonyms.values())
 
 if start_date and end_date and start_date > end_date:
     st.sidebar.error("Start date must be before end date.")
 
+# Auto-adjust max_items -> ESG keyword detected
+auto_max = max_items
+if expanded_keywords and any(
+    k in ["esg", "sustainability", "csrd", "taxonomy", "sfdr"]
+    for k in expanded_keywords
+):
+    auto_max = max(max_items, 35)
+
+# Filter -> publication date, as UTC epoch bounds over the published_ts parsed at ingest
+if start_date and end_date:
+    since_ts = dt.datetime.combine(start_date, dt.time(), dt.timezone.utc).timestamp()
+    until_ts = dt.datetime.combine(end_date + dt.timedelta(days=1), dt.time(), dt.timezone.utc).timestamp()
+else:
+    since_ts = until_ts = None
+
+# keyword filter -> supports multiple terms + synonyms; the spans it records are reused for highlighting
+def _match_article(a):
+    keyword_matcher.match_article(a)
+    return bool(a["matched_keywords"])
+
+def _accept(batch, m):
+    # Vectorized range mask; articles without a parseable date are dropped only when filtering
+    with perf.timer("filter", articles=len(batch)):
+        mask = pd.Series(True, index=range(len(batch)))
+        if since_ts is not None:
+            ts = pd.Series([a.get("published_ts") for a in batch], dtype="float64")
+            mask &= (ts >= since_ts) & (ts < until_ts)
+        if expanded_keywords:
+            mask &= pd.Series([_match_article(a) for a in batch], dtype=bool)
+        return mask.tolist()
+
+def _row(m, a, llm_data):
+    return {
+        "market": m,
+        "title": a.get("title", ""),
+        "source": a.get("source", ""),
+        "published": a.get("published", ""),
+        "published_utc": pd.Timestamp(a["published_ts"], unit="s", tz="UTC") if a.get("published_ts") is not None else pd.NaT,
+        "url": a.get("link", ""),
+        "matched_keywords": ", ".join(a.get("matched_keywords", [])) or None,
+        "alternate_sources": ", ".join(alt["source"] for alt in a.get("alternates", [])) or None,
+        "is_regulatory": llm_data.get("is_regulatory") if llm_data else None,
+        "jurisdiction": llm_data.get("jurisdiction") if llm_data else None,
+        "authority": llm_data.get("authority") if llm_data else None,
+        "topic": llm_data.get("topic") if llm_data else None,
+        "summary": llm_data.get("summary") if llm_data else None,
+        "implications": llm_data.get("implications") if llm_data else None,
+        "risk_tags": ", ".join(llm_data.get("risk_tags", []))
+            if llm_data and isinstance(llm_data.get("risk_tags"), list)
+            else None,
+    }
+
+def _store_events():
+    # Articles were fetched, clustered and classified by the ingest worker;
+    # keyword filter -> ranked full-text search over the whole store
+    for m in selected:
+        with perf.timer("store_query", market=m):
+            loaded = (get_store().search(m, keyword_groups, model=model, limit=auto_max, since=since_ts, until=until_ts)
+                      if keyword_groups else get_store().load(m, model=model, limit=auto_max, since=since_ts, until=until_ts))
+            # the query stops at auto_max; count the full match set only when it was cut
+            seen = (get_store().count(m, keyword_groups, since=since_ts, until=until_ts)
+                    if keyword_groups and len(loaded) >= auto_max else len(loaded))
+        counts = {"feeds_done": 1, "feeds_total": 1, "seen": seen, "accepted": 0,
+                  "classified": 0, "prefiltered": 0, "unclassified": 0}
+        for a, llm_data in loaded:
+            counts["accepted"] += 1
+            if run_llm and llm_data is None:
+                counts["unclassified"] += 1
+            yield ("article", m, (a, llm_data if run_llm else None))
+        counts["classified"] = counts["accepted"] - counts["unclassified"] if run_llm else 0
+        yield ("progress", m, counts)
+
 # Main button
 if st.button("Fetch & Analyse"):
     with st.spinner("Fetching and analysing news... Please wait."):
-        rows = []
+        if auto_max > max_items:
+            st.sidebar.info(
+                "🔍 ESG-related search detected — fetching up to 35 articles per market for broader coverage."
+            )
         if start_date and end_date:
             st.caption(f"Showing news from {start_date} to {end_date}")
 
-        for m in selected:
-            st.subheader(m)
-
-            queries = sources_cfg["google_news_queries"].get(m, [])
-            direct = sources_cfg["direct_rss"].get(m, [])
-
-            # Auto-adjust max_items -> ESG keyword detected
-            auto_max = max_items
-            if expanded_keywords and any(
-                k in ["esg", "sustainability", "csrd", "taxonomy", "sfdr"]
-                for k in expanded_keywords
-            ):
-                auto_max = max(max_items, 35)
-                st.sidebar.info(
-                    "🔍 ESG-related search detected — fetching up to 35 articles per market for broader coverage."
-                )
+        # While the run streams, each market shows progress and a live first page of cards
+        # (one element per market); the paginated view below replaces it when done
+        live = st.empty()
+        highlighter = keyword_matcher if keyword_list else None
+        with live.container():
+            table_ph = st.empty()
+            progress, page_ph = {}, {}
+            for m in selected:
+                st.subheader(m)
+                progress[m] = st.empty()
+                page_ph[m] = st.empty()
+        items = {m: [] for m in selected}
+        index, final_counts = {}, {}
+        tokens_before = input_token_stats()
+
+        if from_store:
+            events = _store_events()
+        else:
+            events = stream_articles(
+                {
+                    m: (sources_cfg["google_news_queries"].get(m, []), sources_cfg["direct_rss"].get(m, []))
+                    for m in selected
+                },
+                accept=_accept,
+                max_items=auto_max,
+                # the local pre-filter labels obvious non-regulatory items without an API call
+                classify=(lambda a, m: analyse_article_safe(a, m, model=model)) if run_llm and llm_batch == 1 else None,
+                classify_batch=(lambda arts: analyse_batch(arts, model, llm_batch, max_workers=1))
+                if run_llm and llm_batch > 1 else None,
+                batch_size=llm_batch,
+                screen=(lambda a: prefilter.screen([a], prefilter_threshold)[0]) if run_llm else None,
+                fetch_workers=fetch_workers,
+                llm_workers=llm_workers,
+                fetch=fetch_feed_memo,
+            )
 
-            articles = recent_articles_for_market(m, queries, direct)[:auto_max]
-
-
-            # Filter -> publication date
-            filtered_articles = []
-            for a in articles:
-                pub_date = None
-                if a.get("published_parsed"):
-                    t = a["published_parsed"]
-                    pub_date = dt.date(t.tm_year, t.tm_mon, t.tm_mday)
-                elif a.get("published"):
-                    try:
-                        pub_date = parser.parse(a["published"]).date()
-                    except Exception:
-                        pub_date = None
-
-                if not start_date or not end_date or (start_date <= pub_date <= end_date):
-                    filtered_articles.append(a)
-
-            articles = filtered_articles
-
-            # keyword filter -> supports multiple terms + synonyms
-            if expanded_keywords:
-                def _match_article(a):
-                    haystack = " ".join([
-                        str(a.get("title", "")),
-                        str(a.get("summary", "")),
-                        str(a.get("source", "")),
-                        str(a.get("link", "")),
-                        str(a.get("query", "")),  
-                    ]).lower()
-                    return any(kw in haystack for kw in expanded_keywords)
-
-                pre_count = len(articles)
-                articles = [a for a in articles if _match_article(a)]
-                post_count = len(articles)
-
-                if post_count == 0:
-                    st.warning(f"No articles in **{m}** matched keywords: {', '.join(sorted(expanded_keywords))}.")
-                    continue
+        def _rows():
+            return [_row(m_, a_, llm_) for m_ in selected for a_, llm_ in items[m_]]
+
+        dirty = set()
+        last_flush = time.monotonic()
+        run_started = time.perf_counter()
+        for kind, m, payload in events:
+            if kind == "progress":
+                c = final_counts[m] = payload
+                label = (f"{c['accepted']}/{c['seen']} articles kept · {c['classified']} classified"
+                         f" · {c['feeds_done']}/{c['feeds_total']} feeds")
+                progress[m].progress(c["feeds_done"] / max(c["feeds_total"], 1), text=label)
+            elif kind == "article":
+                # the same article again replaces its card (a direct copy took over and was re-classified)
+                if (m, id(payload[0])) in index:
+                    items[m][index[(m, id(payload[0]))]] = payload
                 else:
-                    st.info(f"Keyword filter in **{m}**: {post_count}/{pre_count} articles matched.")
-
-            if not articles:
-                st.warning(f"No articles found for market '{m}' matching the selected filters.")
-                continue
-
-            # Display 
-            for a in articles:
-                llm_data = analyse_article(a, m, model=model) if run_llm else None
-                article_card(a, llm_data)
-                rows.append({
-                    "market": m,
-                    "title": a.get("title", ""),
-                    "source": a.get("source", ""),
-                    "published": a.get("published", ""),
-                    "url": a.get("link", ""),
-                    "is_regulatory": llm_data.get("is_regulatory") if llm_data else None,
-                    "jurisdiction": llm_data.get("jurisdiction") if llm_data else None,
-                    "authority": llm_data.get("authority") if llm_data else None,
-                    "topic": llm_data.get("topic") if llm_data else None,
-                    "summary": llm_data.get("summary") if llm_data else None,
-                    "implications": llm_data.get("implications") if llm_data else None,
-                    "risk_tags": ", ".join(llm_data.get("risk_tags", []))
-                        if llm_data and isinstance(llm_data.get("risk_tags"), list)
-                        else None,
-                })
-
+                    index[(m, id(payload[0]))] = len(items[m])
+                    items[m].append(payload)
+                dirty.add(m)
+            elif (m, id(payload)) in index:
+                # an alternate joined an article already on the page; it is re-rendered with the next flush
+                dirty.add(m)
+            if dirty and time.monotonic() - last_flush > 0.5:
+                for d in dirty:
+                    render_cards(items[d][:page_size], highlighter, target=page_ph[d])
+                dirty.clear()
+                table_ph.dataframe(pd.DataFrame(_rows()), use_container_width=True)
+                last_flush = time.monotonic()
+        live.empty()
+        perf.record("run", time.perf_counter() - run_started, markets=len(selected),
+                    articles=sum(len(v) for v in items.values()), source="store" if from_store else "live")
+
+        notes = {}
+        for m in selected:
+            c = final_counts.get(m, {})
+            if c.get("accepted"):
+                if expanded_keywords and from_store:
+                    notes[m] = ("info", f"Full-text search in **{m}**: {c['seen']} stored articles matched, "
+                                        f"showing the top {c['accepted']}.")
+                elif expanded_keywords:
+                    notes[m] = ("info", f"Keyword filter in **{m}**: {c['accepted']}/{c['seen']} articles matched.")
+            elif expanded_keywords:
+                notes[m] = ("warning", f"No articles in **{m}** matched keywords: {', '.join(sorted(expanded_keywords))}.")
+            else:
+                notes[m] = ("warning", f"No articles found for market '{m}' matching the selected filters.")
+        if run_llm and from_store:
+            unclassified = sum(c.get("unclassified", 0) for c in final_counts.values())
+            if unclassified:
+                st.caption(f"{unclassified} stored articles are not classified for {model} yet.")
+        elif run_llm:
+            kept = sum(c["accepted"] for c in final_counts.values())
+            saved = sum(c["prefiltered"] for c in final_counts.values())
+            if kept:
+                st.caption(f"Local pre-filter skipped the LLM for {saved} of {kept} articles.")
+            tokens = {k: v - tokens_before[k] for k, v in input_token_stats().items()}
+            if tokens["raw"]:
+                st.caption(f"Input compaction sent ~{tokens['sent']:,} of {tokens['raw']:,} article tokens "
+                           f"({1 - tokens['sent'] / tokens['raw']:.0%} saved).")
+
+        # Kept across reruns so paging does not refetch
+        st.session_state["cards"] = {"markets": selected, "items": items, "notes": notes, "highlighter": highlighter}
+        for m in selected:
+            st.session_state.pop(f"page_{m}", None)
+        rows = _rows()
         if rows:
             df = pd.DataFrame(rows)
             st.session_state["df"] = df
         else:
             st.session_state["df"] = None
+        st.session_state["run_id"] = uuid.uuid4().hex
+
+cards = st.session_state.get("cards")
+if cards:
+    for m in cards["markets"]:
+        st.subheader(m)
+        if m in cards["notes"]:
+            kind, msg = cards["notes"][m]
+            getattr(st, kind)(msg)
+        render_card_pages(cards["items"][m], key=f"page_{m}", page_size=page_size, highlighter=cards["highlighter"])
 
 df = st.session_state.get("df")
 if df is not None and not df.empty:
+    run_id = st.session_state.get("run_id", "")
+    agg = aggregates(run_id, df)
     st.divider()
     # Table Final
     st.markdown("### Table View / CSV Export")
     st.dataframe(df, use_container_width=True)
     st.download_button(
         "Download CSV",
-        df.to_csv(index=False).encode("utf-8"),
+        csv_export(run_id, df),
         file_name="regulatory_news.csv",
         mime="text/csv"
     )
@@ -184,91 +358,91 @@ if df is not None and not df.empty:
     st.divider()
     st.subheader("Summary Statistics")
 
-    total_articles = len(df)
-    reg_articles = df["is_regulatory"].sum() if "is_regulatory" in df else 0
-    perc_reg = (reg_articles / total_articles * 100) if total_articles > 0 else 0
-
-    top_authority = (
-        df["authority"].value_counts().idxmax()
-        if "authority" in df and not df["authority"].isna().all()
-        else "N/A"
-    )
-
     col1, col2, col3 = st.columns(3)
-    col1.metric("Total Articles", total_articles)
-    col2.metric("Regulatory Articles", reg_articles, f"{perc_reg:.0f}%")
-    col3.metric("Top Authority", top_authority)
+    col1.metric("Total Articles", agg["total"])
+    col2.metric("Regulatory Articles", agg["regulatory"], f"{agg['perc_regulatory']:.0f}%")
+    col3.metric("Top Authority", agg["top_authority"])
 
-    # Articles by Jurisdiction
-    if "jurisdiction" in df and not df["jurisdiction"].isna().all():
+    # Articles by Jurisdiction (charts are drawn from the pre-aggregated counts)
+    if not agg["by_jurisdiction"].empty:
         st.markdown("### Articles by Jurisdiction")
         import altair as alt
         chart = (
-            alt.Chart(df)
+            alt.Chart(agg["by_jurisdiction"])
             .mark_bar()
             .encode(
                 x=alt.X("jurisdiction:N", title="Jurisdiction"),
-                y=alt.Y("count():Q", title="Number of Articles"),
+                y=alt.Y("count:Q", title="Number of Articles"),
                 color="jurisdiction:N",
-                tooltip=["jurisdiction", "count()"],
+                tooltip=["jurisdiction", "count"],
             )
             .properties(width="container", height=350)
         )
         st.altair_chart(chart, use_container_width=True)
 
     # Regulatory Activity Over Time
-    if "published" in df and not df["published"].isna().all():
+    if agg["timeline"] is not None:
         st.markdown("###  Regulatory Activity Over Time")
-        df["published_dt"] = pd.to_datetime(df["published"], errors="coerce")
-        df_timeline = (
-            df.dropna(subset=["published_dt"])
-            .groupby(pd.Grouper(key="published_dt", freq="M"))
-            .size()
-            .reset_index(name="count")
-        )
         import altair as alt
         timeline_chart = (
-            alt.Chart(df_timeline)
+            alt.Chart(agg["timeline"])
             .mark_line(point=True)
             .encode(
-                x=alt.X("published_dt:T", title="Month"),
+                x=alt.X("published_utc:T", title="Month"),
                 y=alt.Y("count:Q", title="Number of Articles"),
-                tooltip=["published_dt", "count"],
+                tooltip=["published_utc", "count"],
             )
             .properties(width="container", height=350)
         )
         st.altair_chart(timeline_chart, use_container_width=True)
 
-    # Insights using LLM 
+    # Insights using LLM: map-reduce over token-budgeted chunks, each cached by content
+    insights_by = st.radio("Group insights by", ["jurisdiction", "topic"], horizontal=True)
     if st.button("Generate Insights Summary"):
         with st.spinner("Analysing trends across articles..."):
-            from openai import OpenAI
-            client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-            context_text = "\n".join(
-                f"[{r.get('jurisdiction','')}] {r.get('summary','')}"
-                for _, r in df.iterrows()
-                if isinstance(r.get("summary"), str)
-            )
-            prompt = (
-                "Summarise the key regulatory themes and market focus across these news items. "
-                "Identify any notable jurisdictions or recurring topics. "
-                "Keep it concise (4-5 sentences).\n\n"
-                f"{context_text}"
-            )
             try:
-                resp = client.chat.completions.create(
-                    model="gpt-4.1-mini",
-                    messages=[
-                        {"role": "system", "content": "You are an expert analyst summarising global regulatory trends."},
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.4,
-                    max_tokens=300,
+                res = generate_insights(
+                    df[["jurisdiction", "topic", "summary"]].to_dict("records"),
+                    model=model, group_by=insights_by, max_workers=llm_workers,
                 )
-                insight = resp.choices[0].message.content.strip()
                 st.success("### AI-Generated Insight")
-                st.write(insight)
+                st.write(res["summary"])
+                st.caption(f"{res['chunks']} chunks · {res['calls']} LLM calls · {res['cached']} reused from cache")
+                if res["partials"]:
+                    with st.expander(f"Partial summaries by {insights_by}"):
+                        for g, parts in res["partials"].items():
+                            st.markdown(f"**{g}**")
+                            for p in parts:
+                                st.write(p)
             except Exception as e:
                 st.error(f"Insight generation failed: {e}")
 else:
     st.write("Select markets and click **Fetch & Analyse** to begin.")
+
+_cs = cache_stats()
+_ps = parse_stats()
+st.sidebar.caption(
+    f"Cache: {_cs['hits']} hits / {_cs['misses']} misses this process · "
+    f"{_cs['entries']} entries ({_cs['bytes'] / 1e6:.1f} MB) · "
+    f"feeds parsed: {_ps['stream']} streamed ({_ps['early_stop']} stopped early), {_ps['feedparser']} via feedparser"
+)
+
+# Per-stage timings for this server process (all sessions)
+with st.sidebar.expander("Performance"):
+    _rec = perf.get_recorder()
+    _snap = _rec.snapshot()
+    if _snap["stages"]:
+        st.dataframe(
+            pd.DataFrame({k: {c: v for c, v in s.items() if c != "events"} for k, s in _snap["stages"].items()}).T,
+            use_container_width=True,
+        )
+        _fetches = _snap["stages"].get("fetch", {}).get("events", [])
+        if _fetches:
+            st.caption("Slowest feeds")
+            st.dataframe(pd.DataFrame(sorted(_fetches, key=lambda e: -e["seconds"])[:10]), use_container_width=True)
+    if _snap["counters"]:
+        st.caption(" · ".join(f"{k}: {v:g}" for k, v in sorted(_snap["counters"].items())))
+    st.download_button("Export JSON", _rec.to_json(), file_name="perf.json", mime="application/json")
+    st.download_button("Export Prometheus", _rec.to_prometheus(), file_name="perf.prom", mime="text/plain")
+    if st.button("Reset timings"):
+        _rec.reset()
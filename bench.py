@@ -0,0 +1,398 @@
+"""Offline benchmark: the fetch, classify and dashboard pipeline against local stand-ins.
+
+A local HTTP server serves synthetic RSS feeds (configurable size and latency,
+with ETag/304 support) and a fake OpenAI-compatible chat endpoint answers
+single and batched classification prompts (configurable latency and error
+rate). Nothing leaves the machine, each scenario starts from an empty cache
+in a temporary directory, and the synthetic data and injected errors are
+seeded (--seed), so runs are comparable. Peak memory is the growth in resident
+set size during a run, sampled from a thread so timings are not distorted.
+
+    python bench.py                                   # 10/100/1000 articles per market
+    python bench.py --sizes 100 --llm-latency 0.5 --llm-error-rate 0.1
+    python bench.py --json bench.json                 # machine-readable results
+    python bench.py --json new.json --compare bench.json
+
+Scenarios, each run cold (empty cache) and then warm (a repeat refresh: feeds
+are revalidated with conditional GETs, classifications come from the cache):
+    fetch     recent_articles_for_market over the market's feeds
+    llm       analyse_article per article (LLM_CONCURRENCY threads)
+    batch     analyse_articles with LLM_BATCH_SIZE articles per request
+    pipeline  app.py itself, run headless with streamlit's AppTest: memoized fetches,
+              filters, pre-filter, batched classification and card rendering. The
+              dashboard caps a market at 60 articles, so larger sizes are spread
+              over several synthetic markets of at most 50.
+"""
+import argparse, json, math, os, platform, random, re, shutil, subprocess, sys, tempfile, threading, time, zlib
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List
+from urllib.parse import parse_qs, urlsplit
+
+WORDS = ("regulator supervisory capital disclosure market conduct crypto asset climate taxonomy bank fund "
+         "guidance consultation enforcement rule liquidity reporting investor securities commission").split()
+# Filler vocabulary, large enough that synthetic items are not near-duplicates of each other
+_vocab_rng = random.Random(7)
+FILLER = ["".join(_vocab_rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(_vocab_rng.randint(4, 9)))
+          for _ in range(20000)]
+
+def _text(rnd: random.Random, n: int) -> str:
+    return " ".join(rnd.choice(WORDS) if rnd.random() < 0.2 else rnd.choice(FILLER) for _ in range(n))
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts: Dict[str, int] = {}
+
+    def add(self, name: str, n: int = 1):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.counts)
+
+def synthetic_feed(name: str, size: int, seed: int) -> bytes:
+    rnd = random.Random(seed)
+    now = time.time()
+    items = []
+    for i in range(size):
+        title = _text(rnd, 8).capitalize()
+        body = _text(rnd, 60)
+        items.append(
+            f"<item><title>{title} {name} {i}</title><link>https://bench.example/{name}/{i}</link>"
+            f"<description>&lt;p&gt;{body}&lt;/p&gt;</description>"
+            f"<pubDate>{formatdate(now - i * 3600, usegmt=True)}</pubDate><guid>{name}-{i}</guid></item>"
+        )
+    return (f"<?xml version='1.0' encoding='UTF-8'?><rss version='2.0'><channel><title>Bench {name}</title>"
+            + "".join(items) + "</channel></rss>").encode()
+
+def start_server(feed_size: int, feed_latency: float, llm_latency: float, llm_error_rate: float, seed: int,
+                 stats: Stats):
+    feeds: Dict[str, bytes] = {}
+    feeds_lock = threading.Lock()
+    errors = random.Random(seed)
+    errors_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, code: int, body: bytes = b"", ctype: str = "application/json", headers: Dict[str, str] = None):
+            self.send_response(code)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            # /<name>?items=N serves N items (default feed_size)
+            url = urlsplit(self.path)
+            name = url.path.strip("/").replace("/", "-")
+            size = int(parse_qs(url.query).get("items", [feed_size])[0])
+            stats.add("feed_requests")
+            time.sleep(feed_latency)
+            if self.headers.get("If-None-Match") == '"bench"':
+                stats.add("feed_304")
+                return self._send(304)
+            with feeds_lock:
+                if name not in feeds:
+                    feeds[name] = synthetic_feed(name, size, zlib.crc32(name.encode()) ^ seed)
+                body = feeds[name]
+            stats.add("feed_bytes", len(body))
+            self._send(200, body, "application/rss+xml", {"ETag": '"bench"'})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            stats.add("llm_calls")
+            time.sleep(llm_latency)
+            with errors_lock:
+                fail, code = errors.random() < llm_error_rate, errors.choice((429, 500))
+            if fail:
+                stats.add("llm_errors")
+                return self._send(code, b'{"error": {"message": "bench error"}}')
+            system, user = body["messages"][0]["content"], body["messages"][-1]["content"]
+            label = {"is_regulatory": True, "jurisdiction": "US", "authority": "SEC", "topic": "rulemaking",
+                     "summary": "A regulator published guidance.", "implications": "Review disclosures.",
+                     "risk_tags": ["rulemaking"]}
+            if "JSON array" in system:
+                ids = re.findall(r"\[id: (\w+)\]", user)
+                stats.add("llm_articles", len(ids))
+                content = json.dumps([dict(label, id=i) for i in ids])
+            elif "Return JSON only" in user:
+                stats.add("llm_articles")
+                content = json.dumps(label)
+            else:
+                content = "- Regulators focused on disclosure and capital."
+            prompt_tokens = (len(system) + len(user)) // 4
+            completion_tokens = len(content) // 4
+            self._send(200, json.dumps({
+                "id": "bench", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            }).encode())
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address):
+            pass    # the streaming parser hangs up once it has enough entries
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def _rss() -> int:
+    """Resident set size in bytes; without /proc (macOS, Windows), the process high-water mark."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+
+class PeakRSS:
+    """Peak RSS growth over a block, sampled from a thread. Unlike tracemalloc
+    (about 5x slower on CPU-bound stages such as clustering) it leaves wall time alone."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, _rss() - self.start)
+
+    def __enter__(self):
+        self.start = _rss()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss() - self.start)
+
+def measure(name: str, size: int, phase: str, fn: Callable[[], int], stats: Stats) -> Dict[str, Any]:
+    import perf
+    from utils import cache_stats
+    stats.reset()
+    perf.get_recorder().reset()
+    cache_before = cache_stats()
+    with PeakRSS() as mem:
+        t = time.perf_counter()
+        articles = fn()
+        wall = time.perf_counter() - t
+    peak = mem.peak
+    cache_after = cache_stats()
+    counters = perf.get_recorder().snapshot(events=False)["counters"]
+    hits, misses = counters.get("llm_cache_hit", 0), counters.get("llm_cache_miss", 0)
+    c_hits = cache_after["hits"] - cache_before["hits"]
+    c_misses = cache_after["misses"] - cache_before["misses"]
+    server = stats.snapshot()
+    return {
+        "scenario": name,
+        "size": size,
+        "phase": phase,
+        "articles": articles,
+        "wall_s": round(wall, 3),
+        "peak_mem_mb": round(peak / 1e6, 2),
+        "feed_requests": server.get("feed_requests", 0),
+        "feed_304": server.get("feed_304", 0),
+        "feed_bytes": server.get("feed_bytes", 0),
+        "llm_calls": server.get("llm_calls", 0),
+        "llm_errors": server.get("llm_errors", 0),
+        "llm_articles_sent": server.get("llm_articles", 0),
+        "llm_cache_hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+        "cache_hit_rate": round(c_hits / (c_hits + c_misses), 3) if c_hits + c_misses else None,
+    }
+
+def feed_urls(base: str, name: str, articles: int, per_feed: int) -> List[str]:
+    """Feeds that together yield exactly `articles` entries when each is read up to per_feed.
+
+    Full feeds carry --feed-size items, so the parser stops early; the last one
+    carries only the remainder.
+    """
+    urls = []
+    for i in range(math.ceil(articles / per_feed)):
+        left = articles - i * per_feed
+        urls.append(f"{base}/{name}/{i}" + (f"?items={left}" if left < per_feed else ""))
+    return urls
+
+APP_MARKET_SIZE = 50    # articles per market in the app scenario ("Max items per market" tops out at 60)
+
+def app_scenario(base: str, size: int, tmp: str) -> Callable[[], int]:
+    """Run app.py headless and press "Fetch & Analyse"; returns the number of cards shown."""
+    import yaml
+    from streamlit.testing.v1 import AppTest
+    from fetch import FEED_MAX_ITEMS
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+    workdir = os.path.join(tmp, f"app-{size}")
+    shutil.copytree(os.path.join(repo, "config"), os.path.join(workdir, "config"))
+    per_market = min(size, APP_MARKET_SIZE)
+    counts = [min(per_market, size - i) for i in range(0, size, per_market)]
+    markets = [f"Bench {i + 1}" for i in range(len(counts))]
+    with open(os.path.join(workdir, "config", "markets.yaml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump({"markets": markets}, f)
+    with open(os.path.join(workdir, "config", "sources.yaml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump({"google_news_queries": {},
+                        "direct_rss": {m: feed_urls(base, f"app/{size}/{i}", n, FEED_MAX_ITEMS)
+                                       for i, (m, n) in enumerate(zip(markets, counts))}}, f)
+
+    def _in_workdir(fn: Callable[[], Any]) -> Any:
+        cwd = os.getcwd()
+        os.chdir(workdir)       # app.py reads config/ relative to the working directory
+        try:
+            return fn()
+        finally:
+            os.chdir(cwd)
+
+    def _click(label: str):
+        next(b for b in at.button if b.label.startswith(label)).click().run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+
+    # The first script run (imports, widgets) is not part of the measurement, nor are the
+    # libraries the dashboard only imports once it shows results (table and charts)
+    import altair, pyarrow  # noqa: F401
+    at = AppTest.from_file(os.path.join(repo, "app.py"), default_timeout=3600)
+    _in_workdir(lambda: at.run())
+    _in_workdir(lambda: at.sidebar.slider[0].set_value(min(60, 5 * math.ceil(per_market / 5))).run())
+    runs = []
+
+    def run_app() -> int:
+        if runs:
+            _in_workdir(lambda: _click("Refetch feeds"))    # a repeat refresh, not the 10-minute feed memo
+        _in_workdir(lambda: _click("Fetch"))
+        runs.append(1)
+        return sum(len(v) for v in at.session_state["cards"]["items"].values())
+
+    return run_app
+
+def run(args, tmp: str) -> List[Dict[str, Any]]:
+    stats = Stats()
+    server = start_server(args.feed_size, args.feed_latency, args.llm_latency, args.llm_error_rate, args.seed, stats)
+    base = f"http://127.0.0.1:{server.server_port}"
+    os.environ["OPENAI_BASE_URL"] = f"{base}/v1"
+    os.environ["OPENAI_API_KEY"] = "bench"
+
+    # Project modules read their settings at import, so they are imported once the environment is set
+    from concurrent.futures import ThreadPoolExecutor
+    from fetch import recent_articles_for_market, FEED_MAX_ITEMS
+    from llm import analyse_article_safe, analyse_articles, _openai_client, LLM_BATCH_SIZE, LLM_CONCURRENCY
+    from utils import get_cache
+    _openai_client()    # keep the openai import out of the first measurement
+
+    results = []
+    market = "Bench"
+    for size in args.sizes:
+        feeds = feed_urls(base, f"fetch/{size}", size, FEED_MAX_ITEMS)
+        rnd = random.Random(args.seed * 100003 + size)
+        articles = [{"title": f"Bench article {size}-{i} " + _text(rnd, 6), "link": f"https://bench.example/llm/{size}/{i}",
+                     "summary": _text(rnd, 40), "source": "Bench"} for i in range(size)]
+
+        def fetch_only():
+            return len(recent_articles_for_market(market, [], feeds))
+
+        def llm_single():
+            with ThreadPoolExecutor(LLM_CONCURRENCY) as pool:
+                return len(list(pool.map(lambda a: analyse_article_safe(a, market), articles)))
+
+        def llm_batched():
+            return len(analyse_articles([(a, market) for a in articles], batch_size=LLM_BATCH_SIZE))
+
+        scenarios = {"fetch": fetch_only, "llm": llm_single, "batch": llm_batched}
+        for name in args.scenarios:
+            fn = scenarios.get(name) or app_scenario(base, size, tmp)
+            get_cache().clear()
+            for phase in ("cold", "warm"):
+                r = measure(name, size, phase, fn, stats)
+                results.append(r)
+                print(_row(r), flush=True)
+    server.shutdown()
+    return results
+
+COLUMNS = ("scenario", "size", "phase", "articles", "wall_s", "peak_mem_mb", "feed_requests", "feed_304",
+           "llm_calls", "llm_errors", "llm_articles_sent", "llm_cache_hit_rate", "cache_hit_rate")
+
+def _row(r: Dict[str, Any]) -> str:
+    return "  ".join(f"{str(r[c] if r[c] is not None else '-'):>{max(len(c), 8)}}" for c in COLUMNS)
+
+def compare(results: List[Dict[str, Any]], baseline_path: str):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["scenario"], r["size"], r["phase"]): r for r in json.load(f)["results"]}
+    print(f"\nWall time vs {baseline_path}:")
+    for r in results:
+        b = baseline.get((r["scenario"], r["size"], r["phase"]))
+        if b and b["wall_s"]:
+            print(f"  {r['scenario']:>9} {r['size']:>5} {r['phase']:>5}  {b['wall_s']:>8.3f}s -> {r['wall_s']:>8.3f}s"
+                  f"  ({r['wall_s'] / b['wall_s']:.2f}x)")
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000],
+                    help="articles per run (in one market, except for the pipeline scenario)")
+    ap.add_argument("--scenarios", nargs="+", default=["fetch", "llm", "batch", "pipeline"],
+                    choices=["fetch", "llm", "batch", "pipeline"])
+    ap.add_argument("--feed-size", type=int, default=100, help="items per synthetic feed (default 100)")
+    ap.add_argument("--feed-latency", type=float, default=0.05, help="seconds per feed request")
+    ap.add_argument("--llm-latency", type=float, default=0.2, help="seconds per chat completion")
+    ap.add_argument("--llm-error-rate", type=float, default=0.02, help="fraction of completions failing with 429/500")
+    ap.add_argument("--host-rate", type=float, default=1000.0,
+                    help="per-host fetch rate limit (all synthetic feeds share one host)")
+    ap.add_argument("--share-window", type=int, default=0,
+                    help="FEED_SHARE_WINDOW seconds (default 0, so warm runs revalidate instead of reusing the cold fetch)")
+    ap.add_argument("--seed", type=int, default=0, help="seed for the synthetic feeds, articles and injected errors")
+    ap.add_argument("--json", help="write results as JSON to this path")
+    ap.add_argument("--compare", help="baseline JSON from an earlier run")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="llm-dashboard-bench-")
+    os.environ["CACHE_DIR"] = os.path.join(tmp, "cache")
+    os.environ["ARTICLE_STORE"] = os.path.join(tmp, "articles.sqlite3")
+    os.environ["FETCH_HOST_RATE"] = str(args.host_rate)
+    os.environ["FETCH_HOST_BURST"] = str(max(3, int(args.host_rate)))
+    os.environ["FEED_SHARE_WINDOW"] = str(args.share_window)
+    os.environ.pop("LLM_FORCE_REFRESH", None)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    print("  ".join(f"{c:>{max(len(c), 8)}}" for c in COLUMNS))
+    try:
+        results = run(args, tmp)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "git_rev": _git_rev(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "params": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+                "results": results,
+            }, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Canonical article identity shared across markets, queries and runs.
+
+Google News redirect links are decoded (or, optionally, followed) to the
+publisher URL, which is then normalized. Articles whose real URL cannot be
+recovered fall back to a hash of their normalized title, outlet and
+publication day.
+"""
+import base64, os, re, time, urllib.parse
+from typing import Any, Dict, Optional
+from utils import NON_WORD_RE, _key, cache_get, cache_set, compact_article_text, outlet_name, parse_timestamp
+
+# Following redirects costs one request per Google News item, so it is opt-in
+RESOLVE_REDIRECTS = os.environ.get("RESOLVE_GNEWS_REDIRECTS") == "1"
+
+TRACKING_PARAMS = {"oc", "ocid", "fbclid", "gclid", "dclid", "mc_cid", "mc_eid", "cmpid",
+                   "smid", "guccounter", "taid", "ito"}
+URL_IN_BYTES_RE = re.compile(rb"https?://[\x21-\x7e]+")
+
+def is_google_news(url: str) -> bool:
+    return (urllib.parse.urlsplit(url).hostname or "").endswith("news.google.com")
+
+def normalize_url(url: str) -> str:
+    """Lowercase scheme/host, drop www., default ports, fragments, tracking params and trailing slashes."""
+    parts = urllib.parse.urlsplit((url or "").strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")
+    )
+    path = re.sub(r"/+$", "", parts.path) or "/"
+    return urllib.parse.urlunsplit(("https" if parts.scheme in ("http", "https") else parts.scheme,
+                                    host, path, urllib.parse.urlencode(query), ""))
+
+def decode_google_news(url: str) -> Optional[str]:
+    """Recover the publisher URL embedded in an older-style news.google.com/rss/articles/<id> link."""
+    path = urllib.parse.urlsplit(url).path
+    if "/articles/" not in path:
+        return None
+    token = path.rsplit("/", 1)[-1]
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except Exception:
+        return None
+    m = URL_IN_BYTES_RE.search(raw)
+    if not m:
+        return None
+    found = m.group(0).decode("ascii", "ignore")
+    return None if is_google_news(found) else found
+
+def _follow_redirects(url: str, timeout: int = 10) -> Optional[str]:
+    from fetch import _session
+    try:
+        resp = _session().get(url, timeout=timeout, allow_redirects=True, stream=True)
+        resp.close()
+    except Exception:
+        return None
+    return None if is_google_news(resp.url) else resp.url
+
+def resolve_url(url: str) -> str:
+    """Publisher URL for a link, resolving Google News redirects where possible (cached)."""
+    if not url or not is_google_news(url):
+        return url
+    ckey = _key("resolve|" + url)
+    cached = cache_get(ckey, namespace="urls")
+    if cached is not None:
+        return cached or url
+    resolved = decode_google_news(url)
+    if not resolved and RESOLVE_REDIRECTS:
+        resolved = _follow_redirects(url)
+    cache_set(ckey, resolved or "", namespace="urls")
+    return resolved or url
+
+def content_key(a: Dict[str, Any]) -> str:
+    title = (a.get("title", "") or "")
+    outlet = outlet_name(a)
+    if outlet:
+        title = title.rsplit(" - ", 1)[0]
+    words = " ".join(NON_WORD_RE.sub(" ", f"{title} {outlet}".lower()).split())
+    # Recurring headlines ("Weekly roundup - Law360") must not collide: the same item seen
+    # through several queries carries the same pubDate, so the UTC day tells reposts apart
+    ts = a["published_ts"] if "published_ts" in a else parse_timestamp(a.get("published", ""))
+    if ts is not None:
+        return f"{words}|{time.strftime('%Y-%m-%d', time.gmtime(ts))}"
+    _, text = compact_article_text(a.get("title", "") or "", a.get("summary", "") or "")
+    return f"{words}|{_key(text.lower())}" if text else words
+
+def article_id(a: Dict[str, Any]) -> str:
+    """Stable ID: hash of the normalized publisher URL, else of the normalized title + outlet + day."""
+    if a.get("article_id"):
+        return a["article_id"]
+    url = a.get("canonical_url") or resolve_url(a.get("link", ""))
+    if url and not is_google_news(url):
+        return _key("url|" + normalize_url(url))
+    return _key("content|" + content_key(a))
+
+def canonicalize(a: Dict[str, Any]) -> Dict[str, Any]:
+    """Annotate an article in place with canonical_url and article_id."""
+    a.pop("article_id", None)
+    url = resolve_url(a.get("link", ""))
+    a["canonical_url"] = normalize_url(url) if url and not is_google_news(url) else ""
+    a["article_id"] = article_id(a)
+    return a
@@ -0,0 +1,4 @@
+import os, tempfile
+
+# utils reads CACHE_DIR at import: keep the tests' cache, locks and store out of .cache/
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="llm-dashboard-tests-"))
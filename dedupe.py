@@ -0,0 +1,132 @@
+"""Near-duplicate article clustering with MinHash + LSH banding.
+
+Syndicated copies of one story (or the same story behind different Google
+News redirect links) collapse into a single representative that carries the
+other copies in `alternates`.
+"""
+import hashlib, random
+import numpy as np
+from typing import Any, Dict, List, Set, Tuple
+from utils import NON_WORD_RE, html_to_text, outlet_name
+
+NUM_PERM = 60
+BANDS, ROWS = 20, 3         # P(candidate) ~ 1 - (1 - J^3)^20: 0.9998 at J=0.7, 0.02 at J=0.1
+MIN_JACCARD = 0.7           # candidates are confirmed on the exact token-set similarity
+_PRIME = (1 << 31) - 1     # a * h + b stays below 2**62, so the permutations run in uint64
+_rng = random.Random(1337)
+_A = np.array([_rng.randrange(1, _PRIME) for _ in range(NUM_PERM)], dtype=np.uint64)[:, None]
+_B = np.array([_rng.randrange(0, _PRIME) for _ in range(NUM_PERM)], dtype=np.uint64)[:, None]
+
+STOPWORDS = {"a", "an", "and", "as", "at", "by", "for", "from", "in", "is", "of", "on",
+             "or", "the", "to", "with", "its", "it", "new", "says", "over"}
+
+def normalize(a: Dict[str, Any]) -> Set[str]:
+    title = a.get("title", "") or ""
+    outlet = outlet_name(a)
+    if outlet:
+        title = title.rsplit(" - ", 1)[0]
+    summary = html_to_text(a.get("summary", ""))
+    if outlet:
+        summary = summary.replace(outlet, " ")
+    tokens = NON_WORD_RE.sub(" ", f"{title} {summary}".lower()).split()
+    # Google News summaries repeat the title, so work on the token set
+    return {t for t in tokens if t not in STOPWORDS}
+
+def _h64(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+
+def minhash(tokens: Set[str]) -> List[int]:
+    hs = np.fromiter((_h64(t) % _PRIME for t in tokens), dtype=np.uint64, count=len(tokens))
+    return ((_A * hs + _B) % _PRIME).min(axis=1).tolist()
+
+def jaccard(x: Set[str], y: Set[str]) -> float:
+    return len(x & y) / len(x | y) if x or y else 1.0
+
+def _alternate(a: Dict[str, Any]) -> Dict[str, Any]:
+    return {"title": a.get("title", ""), "source": outlet_name(a) or a.get("source", ""), "link": a.get("link", "")}
+
+def _band_keys(sig: List[int]) -> List[Tuple[int, tuple]]:
+    return [(b, tuple(sig[b * ROWS:(b + 1) * ROWS])) for b in range(BANDS)]
+
+class Clusterer:
+    """Incremental clustering for streaming: each article starts a cluster or joins the first similar one.
+
+    The representative is whichever copy arrived first, except that a direct
+    regulator feed item takes over from an aggregator copy (as in cluster_articles).
+    """
+
+    def __init__(self):
+        self.buckets: Dict[Tuple[int, tuple], List[int]] = {}
+        self.reps: List[Tuple[Set[str], Dict[str, Any]]] = []
+
+    def add(self, a: Dict[str, Any]) -> Tuple[Dict[str, Any], bool, bool]:
+        """(representative, is_new, promoted); a duplicate is appended to its representative's `alternates`.
+
+        promoted means a direct_rss item replaced the representative's fields in
+        place (the same dict, so references held by the caller stay valid) and
+        the previous representative moved to `alternates`.
+        """
+        tokens = normalize(a)
+        keys = _band_keys(minhash(tokens)) if tokens else []
+        for key in keys:
+            for idx in self.buckets.get(key, ()):
+                rep_tokens, rep = self.reps[idx]
+                if jaccard(tokens, rep_tokens) >= MIN_JACCARD:
+                    if a.get("origin") == "direct_rss" and rep.get("origin") != "direct_rss":
+                        alternates = [_alternate(rep)] + rep["alternates"] + list(a.get("alternates") or [])
+                        rep.clear()
+                        rep.update(a, alternates=alternates)
+                        return rep, False, True
+                    rep["alternates"].append(_alternate(a))
+                    return rep, False, False
+        rep = dict(a, alternates=list(a.get("alternates") or []))
+        self.reps.append((tokens, rep))
+        for key in keys:
+            self.buckets.setdefault(key, []).append(len(self.reps) - 1)
+        return rep, True, False
+
+def cluster_articles(articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Collapse near-duplicates; returns one representative per cluster in first-seen order.
+
+    The representative prefers a direct regulator feed item, then the longest
+    summary; the rest are listed in its `alternates` (title, source, link).
+    """
+    n = len(articles)
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    token_sets, buckets = [], {}
+    for i, a in enumerate(articles):
+        tokens = normalize(a)
+        token_sets.append(tokens)
+        if not tokens:
+            continue
+        for key in _band_keys(minhash(tokens)):
+            bucket = buckets.setdefault(key, [])
+            for j in bucket:
+                if find(i) != find(j) and jaccard(tokens, token_sets[j]) >= MIN_JACCARD:
+                    union(i, j)
+            bucket.append(i)
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(n):
+        clusters.setdefault(find(i), []).append(i)
+
+    out = []
+    for members in clusters.values():
+        rep = max(members, key=lambda i: (articles[i].get("origin") == "direct_rss",
+                                          len(articles[i].get("summary", "") or ""), -i))
+        a = dict(articles[rep])
+        a["alternates"] = [_alternate(articles[i]) for i in members if i != rep]
+        out.append(a)
+    return out
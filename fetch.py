@@ -1,44 +1,239 @@
-import time, feedparser, requests, urllib.parse, datetime as dt
-from typing import List, Dict, Any, Tuple
+import copy, os, threading, time, feedparser, perf, requests, urllib.parse, datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+from utils import _key, cache_get, cache_set, parse_timestamp, struct_time_to_ts
+from canonical import canonicalize
+from feedstream import FeedStreamError, count_parse, stream_entries
+from singleflight import get_flights
+
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", "8"))
+HOST_RATE = float(os.environ.get("FETCH_HOST_RATE", "5"))    # requests per second per host
+HOST_BURST = int(os.environ.get("FETCH_HOST_BURST", "3"))
+FEED_CACHE_TTL = 7 * 24 * 3600
+FEED_MAX_ITEMS = int(os.environ.get("FEED_MAX_ITEMS", "20"))     # entries kept per feed
+FEED_SHARE_WINDOW = int(os.environ.get("FEED_SHARE_WINDOW", "30"))    # seconds a fetch just made elsewhere is served as is
+USER_AGENT = "Mozilla/5.0 (compatible; RegulatoryNewsDashboard/1.0)"
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+def _bucket(url: str) -> TokenBucket:
+    host = urllib.parse.urlsplit(url).hostname or ""
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(HOST_RATE, HOST_BURST)
+        return _buckets[host]
 
 def google_news_rss(query: str, lang="en", region="US") -> str:
     q = urllib.parse.quote(query)
     return f"https://news.google.com/rss/search?q={q}&hl={lang}&gl={region}&ceid={region}:{lang}"
 
-def fetch_feed(url: str, timeout: int = 15) -> List[Dict[str, Any]]:
-    d = feedparser.parse(url)
+_local = threading.local()
+
+def _session() -> requests.Session:
+    # requests.Session is not thread-safe, so keep one pooled session per worker thread
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+        _local.session.headers["User-Agent"] = USER_AGENT
+    return _local.session
+
+def _parse_entries(d, url: str, max_items: int = FEED_MAX_ITEMS, since: Optional[float] = None) -> List[Dict[str, Any]]:
     items = []
-    for e in d.entries[:20]:  
+    for e in d.entries:
+        published = getattr(e, "published", "")
+        # Dates are parsed once here into UTC epoch seconds (None if unparseable)
+        ts = struct_time_to_ts(getattr(e, "published_parsed", None) or getattr(e, "updated_parsed", None))
+        ts = ts if ts is not None else parse_timestamp(published)
+        if since is not None and (ts is None or ts < since):
+            continue
         items.append({
             "title": getattr(e, "title", ""),
             "link": getattr(e, "link", ""),
             "summary": getattr(e, "summary", ""),
-            "published": getattr(e, "published", ""),
+            "published": published,
+            "published_ts": ts,
             "source": getattr(d.feed, "title", url),
             "feed_url": url,
         })
+        if len(items) >= max_items:
+            break
     return items
 
-def recent_articles_for_market(market: str,
-                               queries: List[str],
-                               direct_rss: List[str],
-                               lang_region: Tuple[str,str]=("en","US")) -> List[Dict[str, Any]]:
+def _read_entries(resp: requests.Response, url: str, max_items: int, since: Optional[float],
+                  info: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # Stream-parse the body and stop reading once enough entries are in; malformed or
+    # unusual feeds fall back to feedparser over the full body. info gets bytes read and parser used.
+    chunks = resp.iter_content(64 * 1024)
+    seen: List[bytes] = []
+
+    def _recorded():
+        for chunk in chunks:
+            seen.append(chunk)
+            yield chunk
+
+    try:
+        items = stream_entries(_recorded(), url, max_items, since)
+        count_parse("stream")
+        info.update(bytes=sum(map(len, seen)), parser="stream")
+        return items
+    except FeedStreamError:
+        count_parse("feedparser")
+        content = b"".join(seen) + b"".join(chunks)
+        info.update(bytes=len(content), parser="feedparser")
+        return _parse_entries(feedparser.parse(content, response_headers=dict(resp.headers)), url, max_items, since)
+
+class FeedUnavailable(Exception):
+    """The feed could not be fetched; `items` holds the last cached entries (possibly none)."""
+
+    def __init__(self, url: str, items: List[Dict[str, Any]]):
+        super().__init__(url)
+        self.items = items
+
+def fetch_feed(url: str, timeout: int = 15, max_items: int = FEED_MAX_ITEMS,
+               since: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Up to max_items entries of a feed, optionally only those published at or after `since`.
+
+    Concurrent fetches of the same feed (from any session, or another process)
+    share one request. Raises FeedUnavailable on a network error or HTTP error.
+    """
+    def _just_fetched():
+        cached = cache_get(_key("feed|" + url), namespace="feeds") or {}
+        if (time.time() - cached.get("fetched_at", 0) < FEED_SHARE_WINDOW
+                and cached.get("since") == since and "items" in cached):
+            return cached["items"][:max_items]
+        return None
+
+    def _timed():
+        with perf.timer("fetch", url=url, status="error", bytes=0) as info:
+            return _fetch_feed(url, timeout, max_items, since, info)
+
+    return get_flights().do(f"feed|{url}|{max_items}|{since}", _timed, recheck=_just_fetched)
+
+def _fetch_feed(url: str, timeout: int, max_items: int, since: Optional[float],
+                info: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _recent(items):
+        return [a for a in items if a.get("published_ts") is not None and a["published_ts"] >= since][:max_items] \
+            if since is not None else items[:max_items]
+
+    # Conditional GET: replay the stored validators and serve 304s from the feed cache,
+    # unless the cached items were cut at a later `since` than this call needs
+    ckey = _key("feed|" + url)
+    cached = cache_get(ckey, namespace="feeds") or {}
+    reusable = cached.get("since") is None or (since is not None and cached["since"] <= since)
+    headers = {}
+    if reusable and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if reusable and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+    try:
+        resp = _session().get(url, headers=headers, timeout=timeout, stream=True)
+    except requests.RequestException as e:
+        raise FeedUnavailable(url, _recent(cached.get("items", []))) from e
+    with resp:
+        info["status"] = str(resp.status_code)
+        if resp.status_code == 304 and "items" in cached:
+            return _recent(cached["items"])
+        if resp.status_code >= 400:
+            raise FeedUnavailable(url, _recent(cached.get("items", [])))
+        try:
+            items = _read_entries(resp, url, max_items, since, info)
+        except requests.RequestException as e:
+            # the body is streamed, so a timeout or reset can also surface while it is parsed
+            info["status"] = "error"
+            raise FeedUnavailable(url, _recent(cached.get("items", []))) from e
+
+    cache_set(ckey, {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "since": since,
+        "fetched_at": time.time(),
+        "items": items,
+    }, namespace="feeds", ttl=FEED_CACHE_TTL)
+    return items
+
+def fetch_annotated(url: str, direct: bool = False, since: Optional[float] = None,
+                    raise_errors: bool = False) -> List[Dict[str, Any]]:
+    """Rate-limited fetch_feed that tags each item with its origin and canonical ID.
+
+    A failed fetch returns the last cached entries (or []). With raise_errors it
+    raises FeedUnavailable carrying them instead, so memoizing callers can skip it.
+    """
+    with perf.timer("rate_limit_wait"):
+        _bucket(url).acquire()
+    error = None
+    try:
+        items = fetch_feed(url, since=since)
+    except FeedUnavailable as e:
+        # single-flight followers share the exception, so each annotates its own copy
+        items, error = copy.deepcopy(e.items), e
+    except Exception as e:
+        items, error = [], e
+    for a in items:
+        a["origin"] = "direct_rss" if direct else "google_news"
+        if "published_ts" not in a:
+            a["published_ts"] = parse_timestamp(a.get("published", ""))
+        canonicalize(a)
+    if error is not None and raise_errors:
+        raise FeedUnavailable(url, items) from error
+    return items
+
+def market_feed_urls(market: str,
+                     queries: List[str],
+                     direct_rss: List[str],
+                     lang_region: Tuple[str,str]=("en","US")) -> List[str]:
     lang, region = lang_region
-    articles = []
-    # google news 
-    for q in queries:
-        url = google_news_rss(q + f" {market}", lang=lang, region=region)
-        articles += fetch_feed(url)
-        time.sleep(0.2)
-    # regulator feeds
-    for url in direct_rss:
-        articles += fetch_feed(url)
-        time.sleep(0.2)
+    urls = [google_news_rss(q + f" {market}", lang=lang, region=region) for q in queries]
+    return urls + list(direct_rss)
+
+def plan_feed_urls(plan: Dict[str, Tuple[List[str], List[str]]],
+                   lang_region: Tuple[str,str]=("en","US")) -> Tuple[Dict[str, List[str]], set]:
+    """(market -> feed URLs, set of direct regulator feed URLs) for a market -> (queries, direct_rss) plan."""
+    urls = {m: market_feed_urls(m, q, d, lang_region) for m, (q, d) in plan.items()}
+    return urls, {u for _, d in plan.values() for u in d}
+
+def _dedupe(articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     seen = set()
     deduped = []
     for a in articles:
-        link = a.get("link","")
-        if link and link not in seen:
-            seen.add(link)
+        aid = a.get("article_id") or a.get("link","")
+        if a.get("link") and aid not in seen:
+            seen.add(aid)
             deduped.append(a)
     return deduped
+
+def recent_articles_for_markets(plan: Dict[str, Tuple[List[str], List[str]]],
+                                lang_region: Tuple[str,str]=("en","US"),
+                                max_workers: int = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Fetch every feed of every market in one pool; plan maps market -> (queries, direct_rss)."""
+    urls, direct = plan_feed_urls(plan, lang_region)
+    unique = list(dict.fromkeys(u for us in urls.values() for u in us))
+    with ThreadPoolExecutor(max_workers=max_workers or FETCH_WORKERS) as pool:
+        results = dict(zip(unique, pool.map(lambda u: fetch_annotated(u, u in direct), unique)))
+    return {m: _dedupe([a for u in us for a in results[u]]) for m, us in urls.items()}
+
+def recent_articles_for_market(market: str,
+                               queries: List[str],
+                               direct_rss: List[str],
+                               lang_region: Tuple[str,str]=("en","US"),
+                               max_workers: int = None) -> List[Dict[str, Any]]:
+    return recent_articles_for_markets({market: (queries, direct_rss)}, lang_region, max_workers)[market]
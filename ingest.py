@@ -0,0 +1,84 @@
+"""Headless ingestion worker: poll the configured sources and fill the article store.
+
+    python ingest.py --once                 # single pass, then exit
+    python ingest.py --interval 900         # poll every 15 minutes
+    python ingest.py --once --no-llm --markets Norway Japan
+"""
+import argparse, logging, time, yaml
+from typing import Any, Dict, List, Optional
+from dedupe import cluster_articles
+from feedstream import parse_stats
+from fetch import recent_articles_for_markets
+from llm import analyse_articles, input_token_stats, CLASSIFIER_VERSION
+from prefilter import load_prefilter
+from canonical import article_id
+from store import get_store
+
+log = logging.getLogger("ingest")
+
+def load_config():
+    with open("config/markets.yaml", "r", encoding="utf-8") as f:
+        markets_cfg = yaml.safe_load(f)
+    with open("config/sources.yaml", "r", encoding="utf-8") as f:
+        sources_cfg = yaml.safe_load(f)
+    return markets_cfg, sources_cfg
+
+def run_once(markets: Optional[List[str]] = None, model: str = "gpt-4.1-mini",
+             run_llm: bool = True, max_workers: Optional[int] = None) -> Dict[str, Any]:
+    markets_cfg, sources_cfg = load_config()
+    markets = markets or markets_cfg.get("markets", [])
+    store = get_store()
+    started = time.time()
+
+    fetched = recent_articles_for_markets(
+        {m: (sources_cfg["google_news_queries"].get(m, []), sources_cfg["direct_rss"].get(m, [])) for m in markets},
+        max_workers=max_workers,
+    )
+    pending = {}
+    for m, articles in fetched.items():
+        articles = cluster_articles(articles)
+        store.upsert_articles(m, articles)
+        for a in articles:
+            pending.setdefault(article_id(a), (a, m))
+        log.info("%s: %d articles", m, len(articles))
+
+    classified = 0
+    if run_llm and pending:
+        tokens_before = input_token_stats()
+        done = store.classified_ids(list(pending), model, CLASSIFIER_VERSION)
+        todo = [pending[aid] for aid in pending if aid not in done]
+        results = load_prefilter().screen([a for a, _ in todo])
+        llm_idx = [i for i, r in enumerate(results) if r is None]
+        for i, r in zip(llm_idx, analyse_articles([todo[i] for i in llm_idx], model=model)):
+            results[i] = r
+        store.save_classifications([(article_id(a), r) for (a, _), r in zip(todo, results)], model, CLASSIFIER_VERSION)
+        classified = len(todo)
+        tokens = {k: v - tokens_before[k] for k, v in input_token_stats().items()}
+        log.info("classified %d new articles (%d sent to the LLM); input compaction %d -> %d tokens",
+                 classified, len(llm_idx), tokens["raw"], tokens["sent"])
+
+    return {"articles": len(pending), "classified": classified, "seconds": round(time.time() - started, 1),
+            "feeds_parsed": parse_stats()}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--once", action="store_true", help="run a single pass and exit")
+    ap.add_argument("--interval", type=int, default=900, help="seconds between passes (default 900)")
+    ap.add_argument("--markets", nargs="*", help="markets to poll (default: all in config/markets.yaml)")
+    ap.add_argument("--model", default="gpt-4.1-mini")
+    ap.add_argument("--no-llm", action="store_true", help="store articles without classifying them")
+    ap.add_argument("--workers", type=int, default=None, help="concurrent feed fetches")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    while True:
+        try:
+            log.info("pass finished: %s", run_once(args.markets, args.model, not args.no_llm, args.workers))
+        except Exception:
+            log.exception("ingestion pass failed")
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Map-reduce insights over classified articles.
+
+Summaries are grouped (by jurisdiction or topic) and packed into chunks that
+fit a token budget. Each chunk is summarised in parallel and cached under the
+hash of its content, then the partial summaries are reduced, hierarchically if
+they do not fit one prompt. Chunk boundaries are content-defined, so a few new
+articles only change the chunks they land in and the rest come from the cache.
+"""
+import os, perf, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from llm import _openai_client, _usage, _with_backoff, LLM_CONCURRENCY
+from utils import _key, cache_get, cache_set, estimate_tokens
+
+INSIGHTS_VERSION = "2026-10-16-v1"
+INSIGHTS_CHUNK_TOKENS = int(os.environ.get("INSIGHTS_CHUNK_TOKENS", "3000"))
+LINE_TOKENS = 400       # a single summary line is cut to this
+_stats_lock = threading.Lock()
+
+SYSTEM = "You are an expert analyst summarising global regulatory trends."
+
+MAP_TMPL = """These are summaries of recent regulatory news items ({group}).
+List the key regulatory themes, the authorities involved and any notable developments,
+in 3-5 concise bullet points.
+
+{text}
+"""
+
+REDUCE_TMPL = """Summarise the key regulatory themes and market focus across these news items.
+Identify any notable jurisdictions or recurring topics.
+Keep it concise (4-5 sentences).
+
+{text}
+"""
+
+MERGE_TMPL = """Merge these partial notes on regulatory news into one set of 5-8 concise bullet points,
+keeping jurisdictions and authorities.
+
+{text}
+"""
+
+def _truncate(line: str, max_tokens: int) -> str:
+    if estimate_tokens(line) <= max_tokens:
+        return line
+    return line[:max_tokens * 4].rsplit(" ", 1)[0] + " …"
+
+def _lines(rows: List[Dict[str, Any]], group_by: str) -> Dict[str, List[str]]:
+    """group -> sorted, de-duplicated summary lines."""
+    groups: Dict[str, set] = {}
+    for r in rows:
+        summary = r.get("summary")
+        if not isinstance(summary, str) or not summary.strip():
+            continue
+        group = str(r.get(group_by) or "other").strip() or "other"
+        jur = r.get("jurisdiction") or ""
+        groups.setdefault(group, set()).add(_truncate(" ".join(f"[{jur}] {summary}".split()), LINE_TOKENS))
+    return {g: sorted(ls) for g, ls in sorted(groups.items())}
+
+def chunk_lines(lines: List[str], budget: int = INSIGHTS_CHUNK_TOKENS) -> List[List[str]]:
+    """Pack lines into chunks of at most `budget` tokens.
+
+    Besides the budget, a chunk also ends after any line whose hash hits the
+    boundary condition, so inserting a line only reshapes its own chunk.
+    """
+    every = max(2, budget // (2 * 60))      # ~half a budget per chunk at ~60 tokens a line
+    chunks, cur, used = [], [], 0
+    for line in lines:
+        n = estimate_tokens(line) + 1
+        if cur and used + n > budget:
+            chunks.append(cur)
+            cur, used = [], 0
+        cur.append(line)
+        used += n
+        if int(_key(line)[:8], 16) % every == 0:
+            chunks.append(cur)
+            cur, used = [], 0
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+def _complete(tmpl: str, group: str, lines: List[str], model: str, max_tokens: int, stats: Dict[str, int]) -> str:
+    text = "\n".join(lines)
+    ckey = _key("|".join([INSIGHTS_VERSION, model, tmpl, group, text]))
+    cached = cache_get(ckey, namespace="insights")
+    if cached is not None:
+        with _stats_lock:
+            stats["cached"] += 1
+        return cached
+    client = _openai_client()
+    with perf.timer("insights_request") as info:
+        resp = _with_backoff(lambda: client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SYSTEM},
+                {"role": "user", "content": tmpl.format(group=group, text=text)},
+            ],
+            temperature=0.4,
+            max_tokens=max_tokens,
+        ))
+        info.update(_usage(resp))
+    out = resp.choices[0].message.content.strip()
+    with _stats_lock:
+        stats["calls"] += 1
+    cache_set(ckey, out, namespace="insights")
+    return out
+
+def generate_insights(rows: List[Dict[str, Any]], model: str = "gpt-4.1-mini", group_by: str = "jurisdiction",
+                      budget: int = INSIGHTS_CHUNK_TOKENS, max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """Insight summary for table rows (dicts with summary, jurisdiction, topic).
+
+    Returns {"summary", "partials": {group: [partial, ...]}, "chunks", "calls", "cached"}.
+    """
+    stats = {"calls": 0, "cached": 0}
+    groups = _lines(rows, group_by)
+    work: List[Tuple[str, List[str]]] = [(g, c) for g, ls in groups.items() for c in chunk_lines(ls, budget)]
+    if not work:
+        return {"summary": "", "partials": {}, "chunks": 0, **stats}
+    if len(work) == 1:
+        # Everything fits one prompt: no map step
+        summary = _complete(REDUCE_TMPL, "", work[0][1], model, 300, stats)
+        return {"summary": summary, "partials": {}, "chunks": 1, **stats}
+
+    with ThreadPoolExecutor(max_workers=max_workers or LLM_CONCURRENCY) as pool:
+        mapped = list(pool.map(lambda w: _complete(MAP_TMPL, f"{group_by}: {w[0]}", w[1], model, 250, stats), work))
+        partials: Dict[str, List[str]] = {}
+        for (g, _), p in zip(work, mapped):
+            partials.setdefault(g, []).append(p)
+
+        # Reduce: merge partials level by level until they fit a single prompt
+        level = [f"{group_by} {g}:\n{p}" for g, ps in partials.items() for p in ps]
+        while sum(estimate_tokens(p) + 1 for p in level) > budget and len(level) > 1:
+            merged = chunk_lines(level, budget)
+            if len(merged) == len(level):       # each partial alone exceeds the budget
+                break
+            level = list(pool.map(lambda c: _complete(MERGE_TMPL, "", c, model, 400, stats), merged))
+    summary = _complete(REDUCE_TMPL, "", level, model, 300, stats)
+    return {"summary": summary, "partials": partials, "chunks": len(work), **stats}
@@ -0,0 +1,157 @@
+"""Compiled keyword engine: synonym/typo expansion plus an Aho-Corasick automaton.
+
+Every article field is scanned once; the same match spans drive both the
+keyword filter and highlighting in the article cards.
+"""
+import html, os, yaml
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from utils import plain_text, summary_text
+
+Match = Tuple[int, int, str]      # (start, end, keyword)
+
+def _is_word(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over lowercase patterns, each mapped to the keyword it expands.
+
+    ASCII patterns only match on word boundaries (so "esg" does not match inside
+    "esgrima"); a pattern ending in * matches any word starting with it.
+    """
+
+    def __init__(self, patterns: Dict[str, str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[Tuple[int, str, bool]]] = [[]]     # (length, keyword, prefix)
+        for pattern, keyword in patterns.items():
+            prefix = pattern.endswith("*")
+            p = pattern.rstrip("*").lower()
+            if not p:
+                continue
+            node = 0
+            for ch in p:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = nxt
+            self.out[node].append((len(p), keyword, prefix))
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+        self.empty = len(self.goto) == 1
+
+    def scan(self, text: str) -> List[Match]:
+        """All boundary-respecting matches in one pass, as non-overlapping leftmost-longest spans."""
+        if self.empty or not text:
+            return []
+        lowered = text.lower()
+        if len(lowered) != len(text):       # a few characters change length when lowercased
+            lowered = "".join(c.lower()[0] for c in text)
+        found = []
+        node = 0
+        goto, fail, out = self.goto, self.fail, self.out
+        n = len(lowered)
+        for i, ch in enumerate(lowered):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, keyword, prefix in out[node]:
+                start = i - length + 1
+                first, last = lowered[start], lowered[i]
+                if first.isascii() and _is_word(first) and start > 0 and _is_word(lowered[start - 1]):
+                    continue
+                end = i + 1
+                if prefix:
+                    while end < n and _is_word(lowered[end]):
+                        end += 1
+                elif last.isascii() and _is_word(last) and end < n and _is_word(lowered[end]):
+                    continue
+                found.append((start, end, keyword))
+        found.sort(key=lambda m: (m[0], m[0] - m[1]))
+        spans, last_end = [], -1
+        for m in found:
+            if m[0] >= last_end:
+                spans.append(m)
+                last_end = m[1]
+        return spans
+
+    def highlight(self, text: str, spans: Optional[List[Match]] = None) -> str:
+        """HTML for plain text (utils.plain_text) with matched spans wrapped in <mark>; the text is escaped."""
+        spans = self.scan(text) if spans is None else spans
+        if not spans:
+            return html.escape(text, quote=False)
+        parts, pos = [], 0
+        for start, end, _ in spans:
+            parts += [html.escape(text[pos:start], quote=False), "<mark>",
+                      html.escape(text[start:end], quote=False), "</mark>"]
+            pos = end
+        parts.append(html.escape(text[pos:], quote=False))
+        return "".join(parts)
+
+    def match_article(self, a: Dict[str, Any]) -> Dict[str, List[Match]]:
+        """Scan each displayed field once and record the spans on the article.
+
+        Sets a["keyword_spans"] (title/summary spans over their cleaned text, reused
+        by the card highlighter) and a["matched_keywords"]; returns the spans.
+        """
+        fields = {
+            "title": plain_text(a.get("title", "")),
+            "summary": summary_text(a),
+            "source": str(a.get("source", "")),
+            "link": str(a.get("link", "")),
+        }
+        spans = {k: self.scan(v) for k, v in fields.items()}
+        a["keyword_spans"] = {"title": spans["title"], "summary": spans["summary"]}
+        a["matched_keywords"] = sorted({kw for s in spans.values() for _, _, kw in s})
+        return spans
+
+KEYWORDS_PATH = "config/keywords.yaml"
+
+def load_keyword_config(path: str = KEYWORDS_PATH) -> Dict[str, Any]:
+    # Keyed on the file's mtime (like app.load_yaml), so an edited config applies without a restart
+    return _load_keyword_config(path, os.path.getmtime(path))
+
+@lru_cache(maxsize=4)
+def _load_keyword_config(path: str, mtime: float) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+def expand_keywords(keywords: List[str], cfg: Optional[Dict[str, Any]] = None) -> Dict[str, List[str]]:
+    """keyword -> synonym list, after mapping typos to the keyword they stand for."""
+    cfg = load_keyword_config() if cfg is None else cfg
+    synonyms = cfg.get("synonyms") or {}
+    typos = cfg.get("typos") or {}
+    groups: Dict[str, List[str]] = {}
+    for k in keywords:
+        k = k.strip().lower()
+        if not k:
+            continue
+        k = typos.get(k, k)
+        groups.setdefault(k, list(dict.fromkeys([k, *synonyms.get(k, [])])))
+    return groups
+
+def compile_keywords(keywords: Tuple[str, ...], path: str = KEYWORDS_PATH) -> Tuple[KeywordMatcher, Dict[str, List[str]]]:
+    """Compile (once per distinct keyword tuple and config version) the matcher and its synonym groups."""
+    return _compile_keywords(keywords, path, os.path.getmtime(path))
+
+@lru_cache(maxsize=64)
+def _compile_keywords(keywords: Tuple[str, ...], path: str, mtime: float) -> Tuple[KeywordMatcher, Dict[str, List[str]]]:
+    groups = expand_keywords(list(keywords), load_keyword_config(path))
+    patterns = {}
+    for k, terms in groups.items():
+        for t in terms:
+            patterns.setdefault(t.strip('"').lower(), k)
+    return KeywordMatcher(patterns), groups
@@ -1,22 +1,38 @@
-import os, json
-from typing import Dict, Any
-from utils import _key, cache_get, cache_set, clean_text
+import os, json, perf, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, List, Tuple
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from utils import _key, cache_get, cache_get_many, cache_set, cache_set_many, clean_text, compact_article_text, estimate_tokens
+from canonical import article_id
+from singleflight import file_locks, get_flights
 
-CLASSIFIER_VERSION = "2025-11-04-reg-v2"
+CLASSIFIER_VERSION = "2026-10-17-reg-v5"     # v5: compacted text keeps regulator link text
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "5"))
+LLM_BATCH_SIZE = int(os.environ.get("LLM_BATCH_SIZE", "8"))     # articles per request; 1 = one call each
+BATCH_RETRIES = 1               # re-sends of the elements missing or invalid in a batch response
+BATCH_TOKENS_PER_ARTICLE = 300
+LLM_INPUT_TOKENS = int(os.environ.get("LLM_INPUT_TOKENS", "600"))    # cap on article text per prompt
+BACKOFF_BASE, BACKOFF_CAP = 0.5, 20.0
 
-SYSTEM = """You are a classifier and extractor for regulatory or policy-related financial news.
-Return ONLY a compact JSON object with fields:
-- is_regulatory: boolean
+ROLE = "You are a classifier and extractor for regulatory or policy-related financial news.\n"
+
+FIELDS = """- is_regulatory: boolean
 - jurisdiction: short string (e.g., "US", "UK", "EU", "NO", "JP")
 - authority: string (e.g., "SEC", "FCA", "ESMA", "Finanstilsynet", "JFSA", etc.)
 - topic: short string (e.g., "market conduct", "prudential", "crypto/MiCA", etc.)
 - summary: 2–3 sentence summary, plain English
 - implications: brief list-style string of potential impacts for a large global investor
 - risk_tags: list of up to 4 tags (e.g., ["policy shift", "enforcement", "rulemaking"])
+"""
 
+RULE = """
 Classify an article as regulatory **if it discusses, explains, or analyses any policy, rule, regulatory agenda, or supervisory action**, even if written by law firms or consultancies.
 """
 
+SYSTEM = ROLE + "Return ONLY a compact JSON object with fields:\n" + FIELDS + RULE
+
 USER_TMPL = """Article:
 Title: {title}
 Source: {source}
@@ -24,51 +40,312 @@ Published: {published}
 URL: {url}
 Text: {text}
 
-Market context: {market}
 Return JSON only.
 """
 
+# Same fields and rule as SYSTEM, but a single output instruction: an array, one object per article
+BATCH_SYSTEM = ROLE + """You will receive several articles, each introduced by [id: ...].
+Return ONLY a JSON array with one compact JSON object per article, in input order. Each object has
+an "id" field (the article's id) and the fields:
+""" + FIELDS + RULE
+
+BATCH_ITEM_TMPL = """[id: {id}]
+Title: {title}
+Source: {source}
+Published: {published}
+URL: {url}
+Text: {text}
+"""
+
+class Classification(BaseModel):
+    """The SYSTEM field schema; batch elements are validated against it."""
+    is_regulatory: bool
+    jurisdiction: str = ""
+    authority: str = ""
+    topic: str = ""
+    summary: str = ""
+    implications: str = ""
+    risk_tags: List[str] = Field(default_factory=list)
+
+    @field_validator("jurisdiction", "authority", "topic", "summary", mode="before")
+    @classmethod
+    def _text(cls, v):
+        return "" if v is None else v
+
+    @field_validator("implications", mode="before")
+    @classmethod
+    def _implications(cls, v):
+        if isinstance(v, list):
+            return "; ".join(map(str, v))
+        return "" if v is None else v
+
+    @field_validator("risk_tags", mode="before")
+    @classmethod
+    def _tags(cls, v):
+        if isinstance(v, str):
+            v = [v]
+        return list(v or [])[:4]
+
+@lru_cache(maxsize=1)
 def _openai_client():
+    # One pooled client per process; retries are handled by _with_backoff
     from openai import OpenAI
-    return OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    return OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), max_retries=0)
 
-def analyse_article(article: Dict[str, Any], market: str, model: str = "gpt-4.1-mini") -> Dict[str, Any]:
-    title = clean_text(article.get("title", ""))
-    text = clean_text(article.get("summary", ""))
-    payload = USER_TMPL.format(
-        title=title,
-        source=article.get("source", ""),
-        published=article.get("published", ""),
-        url=article.get("link", ""),
-        text=text,
-        market=market,
-    )
-    force_refresh = os.environ.get("LLM_FORCE_REFRESH") == "1"
-    ckey = _key("|".join([CLASSIFIER_VERSION, model, SYSTEM, payload]))
-    cached = cache_get(ckey)
-    if cached and not force_refresh:
-        return cached
+def _retryable(e: Exception) -> bool:
+    import openai
+    if isinstance(e, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
 
-    client = _openai_client()
-    resp = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": SYSTEM},
-            {"role": "user", "content": payload},
-        ],
-        temperature=0.2,
-        max_tokens=350,
-    )
-    content = resp.choices[0].message.content.strip()
+def _with_backoff(fn, max_retries: int = LLM_MAX_RETRIES):
+    """Call fn(), retrying 429/5xx/connection errors with full-jitter exponential backoff."""
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == max_retries or not _retryable(e):
+                raise
+            delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            retry_after = getattr(getattr(e, "response", None), "headers", {}).get("retry-after")
+            if retry_after and retry_after.replace(".", "", 1).isdigit():
+                delay = max(delay, float(retry_after))
+            time.sleep(delay)
 
+def _parse_json(content: str) -> Dict[str, Any]:
     try:
         if content.startswith("```"):
             content = content.strip("` \n")
             if content.lower().startswith("json"):
                 content = content[4:].strip()
+        return json.loads(content)
+    except Exception:
+        return {"is_regulatory": False, "summary": "LLM output parsing failed.", "raw": content}
+
+_input_tokens = {"raw": 0, "sent": 0}
+_input_lock = threading.Lock()
+
+def input_token_stats() -> Dict[str, int]:
+    """Estimated article-text tokens before (raw) and after (sent) compaction, this process."""
+    with _input_lock:
+        return dict(_input_tokens)
+
+def _prompt_fields(a: Dict[str, Any]) -> Dict[str, str]:
+    title, text = compact_article_text(a.get("title", ""), a.get("summary", ""), LLM_INPUT_TOKENS,
+                                       a.get("origin") == "google_news")
+    raw = estimate_tokens(clean_text(a.get("title", ""))) + estimate_tokens(clean_text(a.get("summary", "")))
+    with _input_lock:
+        _input_tokens["raw"] += raw
+        _input_tokens["sent"] += estimate_tokens(title) + estimate_tokens(text)
+    return {
+        "title": title,
+        "source": a.get("source", ""),
+        "published": a.get("published", ""),
+        "url": a.get("canonical_url") or a.get("link", ""),
+        "text": text,
+    }
+
+def _usage(resp) -> Dict[str, int]:
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return {}
+    return {"prompt_tokens": usage.prompt_tokens or 0, "completion_tokens": usage.completion_tokens or 0}
+
+def _cache_key(article: Dict[str, Any], model: str) -> str:
+    # Single and batched calls share entries: both produce the SYSTEM schema
+    return _key("|".join([CLASSIFIER_VERSION, model, SYSTEM, article_id(article)]))
+
+def _parse_json_array(content: str) -> List[Any]:
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.strip("` \n")
+        if content.lower().startswith("json"):
+            content = content[4:].strip()
+    try:
         data = json.loads(content)
     except Exception:
-        data = {"is_regulatory": False, "summary": "LLM output parsing failed.", "raw": content}
+        return []
+    if isinstance(data, dict):
+        data = data.get("results", [data])
+    return data if isinstance(data, list) else []
+
+def _classify_batch(batch: List[Tuple[str, Dict[str, Any]]], model: str) -> Dict[str, Dict[str, Any]]:
+    """One request for (cache key, article) pairs; returns the valid results by cache key."""
+    ids = {str(i + 1): key for i, (key, _) in enumerate(batch)}      # short local ids keep the prompt small
+    payload = "\n".join(
+        BATCH_ITEM_TMPL.format(id=i, **_prompt_fields(a)) for i, (_, a) in zip(ids, batch)
+    ) + "\nReturn a JSON array only."
+    client = _openai_client()
+    try:
+        with perf.timer("llm_request", articles=len(batch)) as info:
+            resp = _with_backoff(lambda: client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": BATCH_SYSTEM},
+                    {"role": "user", "content": payload},
+                ],
+                temperature=0.2,
+                max_tokens=BATCH_TOKENS_PER_ARTICLE * len(batch),
+            ))
+            info.update(_usage(resp))
+    except Exception:
+        perf.incr("llm_request_failed")
+        return {}
+    out = {}
+    for el in _parse_json_array(resp.choices[0].message.content or ""):
+        if not isinstance(el, dict):
+            continue
+        key = ids.get(str(el.pop("id", "")).strip())
+        if key is None or key in out:
+            continue
+        try:
+            out[key] = Classification.model_validate(el).model_dump()
+        except ValidationError:
+            continue
+    return out
+
+def _classify_batch_locked(batch: List[Tuple[str, Dict[str, Any]]], model: str,
+                           recheck: bool = True) -> Dict[str, Dict[str, Any]]:
+    """_classify_batch under the batch's cross-process file locks, caching what it classifies.
+
+    Articles another process classified while this one waited on the locks are
+    read back from the cache instead of being sent again.
+    """
+    keys = [k for k, _ in batch]
+    with file_locks("llm|" + k for k in keys):
+        done = {k: v for k, v in cache_get_many(keys, namespace="llm").items() if v} if recheck else {}
+        if done:
+            get_flights().rechecked(len(done))
+        todo = [(k, a) for k, a in batch if k not in done]
+        fresh = _classify_batch(todo, model) if todo else {}
+        cache_set_many(fresh, namespace="llm")
+    return {**done, **fresh}
+
+def analyse_batch(articles: List[Dict[str, Any]], model: str = "gpt-4.1-mini",
+                  batch_size: int = LLM_BATCH_SIZE, max_workers: int = None) -> List[Dict[str, Any]]:
+    """Classify articles batch_size per request; results come back in input order.
+
+    Results are cached per article under the same key as analyse_article. Elements
+    missing from a response or failing validation are re-sent (only those), then
+    fall back to one single-article call each. Articles another caller in this
+    process is already classifying are waited on rather than sent again; with
+    file locks, each batch also rechecks the cache after locking its keys, so
+    another process (e.g. the ingest worker) classifying them is not repeated.
+    """
+    if not articles:
+        return []
+    keys = [_cache_key(a, model) for a in articles]
+    force_refresh = os.environ.get("LLM_FORCE_REFRESH") == "1"
+    cached = {} if force_refresh else cache_get_many(keys, namespace="llm")
+    results = {k: v for k, v in cached.items() if v}
+    perf.incr("llm_cache_hit", len(set(results)))
+    perf.incr("llm_cache_miss", len(set(keys) - set(results)))
+    flights = get_flights()
+    lead, follow = {}, {}
+    for k, a in zip(keys, articles):
+        if k not in results and k not in lead and k not in follow:
+            call, leader = flights.begin("llm|" + k)
+            (lead if leader else follow)[k] = (a, call)
+
+    todo = {k: a for k, (a, _) in lead.items()}
+    error = None
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers or LLM_CONCURRENCY) as pool:
+            for _ in range(BATCH_RETRIES + 1):
+                if not todo:
+                    break
+                items = list(todo.items())
+                batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+                fresh = {}
+                for done in pool.map(lambda b: _classify_batch_locked(b, model, not force_refresh), batches):
+                    fresh.update(done)
+                results.update(fresh)
+                todo = {k: a for k, a in todo.items() if k not in fresh}
+            for k, r in zip(todo, pool.map(lambda kv: _classify_one_safe(kv[1], model, kv[0]), todo.items())):
+                results[k] = r
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        for k, (_, call) in lead.items():
+            flights.finish("llm|" + k, call, results.get(k),
+                           None if k in results else error or RuntimeError("batch aborted"))
+    for k, (_, call) in follow.items():
+        try:
+            results[k] = flights.wait(call)
+        except Exception as e:
+            results[k] = {"is_regulatory": False, "summary": f"LLM call failed: {e}", "error": True}
+    return [results[k] for k in keys]
+
+def _classify_one(article: Dict[str, Any], model: str, ckey: str) -> Dict[str, Any]:
+    payload = USER_TMPL.format(**_prompt_fields(article))
+    client = _openai_client()
+    with perf.timer("llm_request", articles=1) as info:
+        resp = _with_backoff(lambda: client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SYSTEM},
+                {"role": "user", "content": payload},
+            ],
+            temperature=0.2,
+            max_tokens=350,
+        ))
+        info.update(_usage(resp))
+    data = _parse_json(resp.choices[0].message.content.strip())
+
+    cache_set(ckey, data, namespace="llm")
+    return data
+
+def _classify_one_safe(article: Dict[str, Any], model: str, ckey: str) -> Dict[str, Any]:
+    try:
+        return _classify_one(article, model, ckey)
+    except Exception as e:
+        return {"is_regulatory": False, "summary": f"LLM call failed: {e}", "error": True}
+
+def analyse_article(article: Dict[str, Any], market: str, model: str = "gpt-4.1-mini") -> Dict[str, Any]:
+    # Every extracted field is a property of the article itself, so results are cached
+    # under its canonical ID and shared across markets, queries and redirect URLs.
+    # `market` is kept for API compatibility.
+    force_refresh = os.environ.get("LLM_FORCE_REFRESH") == "1"
+    ckey = _cache_key(article, model)
+    cached = cache_get(ckey, namespace="llm")
+    if cached and not force_refresh:
+        perf.incr("llm_cache_hit")
+        return cached
+    perf.incr("llm_cache_miss")
+    # Concurrent requests for the same article (other sessions or processes) share one call
+    return get_flights().do("llm|" + ckey, lambda: _classify_one(article, model, ckey),
+                            recheck=None if force_refresh else lambda: cache_get(ckey, namespace="llm"))
+
+def analyse_article_safe(article: Dict[str, Any], market: str, model: str = "gpt-4.1-mini") -> Dict[str, Any]:
+    """analyse_article that returns a non-cached error result instead of raising."""
+    try:
+        return analyse_article(article, market, model=model)
+    except Exception as e:
+        return {"is_regulatory": False, "summary": f"LLM call failed: {e}", "error": True}
+
+def analyse_articles(items: List[Tuple[Dict[str, Any], str]],
+                     model: str = "gpt-4.1-mini",
+                     max_workers: int = None,
+                     batch_size: int = LLM_BATCH_SIZE) -> List[Dict[str, Any]]:
+    """Classify (article, market) pairs concurrently; results come back in input order.
+
+    With batch_size > 1 several articles share each request (see analyse_batch).
+    A pair whose call still fails after retries gets an error result (see
+    analyse_article_safe) instead of aborting the whole batch.
+    """
+    def _one(item):
+        return analyse_article_safe(item[0], item[1], model=model)
 
-    cache_set(ckey, data)
-    return data
\ No newline at end of file
+    if not items:
+        return []
+    # The same article listed under several markets is classified once
+    unique = {}
+    for item in items:
+        unique.setdefault(article_id(item[0]), item)
+    if batch_size > 1:
+        results = dict(zip(unique, analyse_batch([a for a, _ in unique.values()], model, batch_size, max_workers)))
+        return [results[article_id(a)] for a, _ in items]
+    with ThreadPoolExecutor(max_workers=max_workers or LLM_CONCURRENCY) as pool:
+        results = dict(zip(unique, pool.map(_one, unique.values())))
+    return [results[article_id(a)] for a, _ in items]
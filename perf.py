@@ -0,0 +1,112 @@
+"""Process-wide performance instrumentation.
+
+Stages record durations (plus optional fields such as URL, bytes or tokens)
+and counters count events such as LLM cache hits. snapshot() summarises them
+for the dashboard's Performance panel; to_json() and to_prometheus() export
+the same numbers for tracking regressions over time.
+
+    with perf.timer("filter", articles=len(batch)):
+        ...
+    perf.record("fetch", seconds, url=url, status="200", bytes=n)   # numeric fields are also summed
+    perf.incr("llm_cache_hit")
+"""
+import json, threading, time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+MAX_SAMPLES = 5000      # per stage, for the percentiles
+MAX_EVENTS = 500        # recent detailed records per stage (e.g. one per feed URL)
+PROM_PREFIX = "llm_dashboard"
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.stages: Dict[str, Dict[str, Any]] = {}
+            self.counters: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float, **fields):
+        with self._lock:
+            s = self.stages.get(stage)
+            if s is None:
+                s = self.stages[stage] = {"count": 0, "total": 0.0, "max": 0.0, "sums": {},
+                                          "samples": deque(maxlen=MAX_SAMPLES), "events": deque(maxlen=MAX_EVENTS)}
+            s["count"] += 1
+            s["total"] += seconds
+            s["max"] = max(s["max"], seconds)
+            s["samples"].append(seconds)
+            for k, v in fields.items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    s["sums"][k] = s["sums"].get(k, 0) + v
+            if fields:
+                s["events"].append({"seconds": round(seconds, 4), **fields})
+
+    def incr(self, name: str, n: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def timer(self, stage: str, **fields):
+        t = time.perf_counter()
+        try:
+            yield fields        # callers may add fields (e.g. bytes) before the block ends
+        finally:
+            self.record(stage, time.perf_counter() - t, **fields)
+
+    def snapshot(self, events: bool = True) -> Dict[str, Any]:
+        with self._lock:
+            stages = {}
+            for name, s in self.stages.items():
+                samples = sorted(s["samples"])
+                stages[name] = {
+                    "count": s["count"],
+                    "total_s": round(s["total"], 4),
+                    "p50_ms": round(_quantile(samples, 0.5) * 1000, 2),
+                    "p95_ms": round(_quantile(samples, 0.95) * 1000, 2),
+                    "max_ms": round(s["max"] * 1000, 2),
+                    **{f"sum_{k}": v for k, v in s["sums"].items()},
+                }
+                if events:
+                    stages[name]["events"] = list(s["events"])
+            return {"since": self.started, "stages": stages, "counters": dict(self.counters)}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2, default=str)
+
+    def to_prometheus(self) -> str:
+        snap = self.snapshot(events=False)
+        lines = [f"# TYPE {PROM_PREFIX}_stage_seconds summary"]
+        for name, s in sorted(snap["stages"].items()):
+            label = f'stage="{name}"'
+            lines += [
+                f'{PROM_PREFIX}_stage_seconds{{{label},quantile="0.5"}} {s["p50_ms"] / 1000:.6g}',
+                f'{PROM_PREFIX}_stage_seconds{{{label},quantile="0.95"}} {s["p95_ms"] / 1000:.6g}',
+                f"{PROM_PREFIX}_stage_seconds_sum{{{label}}} {s['total_s']}",
+                f"{PROM_PREFIX}_stage_seconds_count{{{label}}} {s['count']}",
+            ]
+        sums = [(name, k[4:], v) for name, s in sorted(snap["stages"].items()) for k, v in s.items() if k.startswith("sum_")]
+        if sums:
+            lines.append(f"# TYPE {PROM_PREFIX}_stage_field_total counter")
+            lines += [f'{PROM_PREFIX}_stage_field_total{{stage="{n}",field="{f}"}} {v}' for n, f, v in sums]
+        for name, v in sorted(snap["counters"].items()):
+            lines += [f"# TYPE {PROM_PREFIX}_{name}_total counter", f"{PROM_PREFIX}_{name}_total {v}"]
+        return "\n".join(lines) + "\n"
+
+def _quantile(sorted_samples: List[float], q: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))]
+
+_recorder = Recorder()
+
+def get_recorder() -> Recorder:
+    return _recorder
+
+record = _recorder.record
+incr = _recorder.incr
+timer = _recorder.timer
@@ -0,0 +1,156 @@
+"""Streaming fetch -> dedupe -> filter -> classify pipeline.
+
+stream_articles yields events as soon as each feed arrives and each
+classification finishes, so the dashboard can render cards progressively:
+
+    ("progress", market, counts)         counts: feeds_done, feeds_total, seen, accepted, classified, prefiltered
+    ("article", market, (article, llm))  a card is ready (llm is None when classification is off); the
+                                         same article object again means its card changed (see below)
+    ("alternate", market, article)       a near-duplicate joined an already emitted article
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from dedupe import Clusterer
+from fetch import fetch_annotated, plan_feed_urls, FETCH_WORKERS
+from llm import LLM_CONCURRENCY
+
+Event = Tuple[str, str, Any]
+
+def stream_articles(plan: Dict[str, Tuple[List[str], List[str]]],
+                    accept: Callable[[List[Dict[str, Any]], str], List[bool]],
+                    max_items: int,
+                    classify: Optional[Callable[[Dict[str, Any], str], Dict[str, Any]]] = None,
+                    screen: Optional[Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = None,
+                    lang_region: Tuple[str, str] = ("en", "US"),
+                    fetch_workers: Optional[int] = None,
+                    llm_workers: Optional[int] = None,
+                    fetch: Callable[[str, bool], List[Dict[str, Any]]] = fetch_annotated,
+                    classify_batch: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None,
+                    batch_size: int = 1) -> Iterator[Event]:
+    """Run the pipeline for market -> (queries, direct_rss) `plan`, yielding events as work completes.
+
+    accept(articles, market) applies the date/keyword filters to each feed's
+    new articles at once and returns a keep-mask; at most max_items accepted
+    articles are kept per market. screen(article) may label an article
+    without the LLM; classify(article, market) runs it. An article accepted in
+    several markets is classified once. fetch(url, direct) returns a feed's
+    annotated items (the dashboard passes a memoized fetch_annotated).
+    With classify_batch, each feed's new articles are classified batch_size
+    per call instead.
+
+    A direct_rss copy arriving after an aggregator copy of the same story
+    becomes the representative (see dedupe.Clusterer). If the earlier copy was
+    only labelled by screen, the article is sent to the LLM and its card is
+    emitted again with the classification.
+    """
+    urls, direct = plan_feed_urls(plan, lang_region)
+    url_markets: Dict[str, List[str]] = {}
+    for m, us in urls.items():
+        for u in us:
+            url_markets.setdefault(u, []).append(m)
+    counts = {m: {"feeds_done": 0, "feeds_total": len(us), "seen": 0, "accepted": 0,
+                  "classified": 0, "prefiltered": 0} for m, us in urls.items()}
+    clusterers = {m: Clusterer() for m in urls}
+    seen_ids = {m: set() for m in urls}
+    accepted = {m: set() for m in urls}
+    screened = {m: set() for m in urls}
+    emitted = {m: set() for m in urls}
+    llm_done: Dict[str, Dict[str, Any]] = {}
+    llm_waiting: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+
+    fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers or FETCH_WORKERS)
+    llm_pool = ThreadPoolExecutor(max_workers=llm_workers or LLM_CONCURRENCY)
+    pending: Dict[Any, Tuple[str, Any]] = {fetch_pool.submit(fetch, u, u in direct): ("feed", u)
+                                           for u in url_markets}
+
+    def _ready(m: str, a: Dict[str, Any], llm: Optional[Dict[str, Any]]) -> Event:
+        emitted[m].add(id(a))
+        if llm is not None:
+            counts[m]["classified"] += 1
+        return ("article", m, (a, llm))
+
+    def _route(m: str, rep: Dict[str, Any], to_classify: List[Tuple[str, Dict[str, Any], str]]) -> Iterator[Event]:
+        # An article accepted in several markets is classified once
+        rid = rep.get("article_id") or rep.get("link", "")
+        if rid in llm_done:
+            yield _ready(m, rep, llm_done[rid])
+        elif rid in llm_waiting:
+            llm_waiting[rid].append((m, rep))
+        else:
+            llm_waiting[rid] = [(m, rep)]
+            to_classify.append((rid, rep, m))
+
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                kind, key = pending.pop(fut)
+                if kind == "llm":
+                    for rid, res in zip(key, fut.result()):
+                        llm_done[rid] = res
+                        for m, a in llm_waiting.pop(rid, []):
+                            yield _ready(m, a, res)
+                            yield ("progress", m, dict(counts[m]))
+                    continue
+
+                items = fut.result()
+                to_classify = []
+                for m in url_markets[key]:
+                    c = counts[m]
+                    c["feeds_done"] += 1
+                    fresh, promoted = [], []
+                    for item in items:
+                        aid = item.get("article_id") or item.get("link", "")
+                        if not item.get("link") or aid in seen_ids[m]:
+                            continue
+                        seen_ids[m].add(aid)
+                        c["seen"] += 1
+                        rep, is_new, was_promoted = clusterers[m].add(item)
+                        if is_new or (was_promoted and id(rep) not in accepted[m]):
+                            # a direct copy that took over a rejected aggregator copy is filtered afresh
+                            fresh.append(rep)
+                        elif was_promoted:
+                            promoted.append(rep)
+                        elif id(rep) in emitted[m]:
+                            yield ("alternate", m, rep)
+                    mask = accept(fresh, m) if fresh else []
+                    for rep, ok in zip(fresh, mask):
+                        if not ok or c["accepted"] >= max_items:
+                            continue
+                        c["accepted"] += 1
+                        accepted[m].add(id(rep))
+                        if classify is None and classify_batch is None:
+                            yield _ready(m, rep, None)
+                            continue
+                        label = screen(rep) if screen else None
+                        if label is not None:
+                            c["prefiltered"] += 1
+                            screened[m].add(id(rep))
+                            yield _ready(m, rep, label)
+                            continue
+                        yield from _route(m, rep, to_classify)
+                    if promoted:
+                        # Already accepted: refresh the keyword annotations for the new text. Direct
+                        # items always reach the LLM, so a pre-filtered label is replaced by a classification.
+                        accept(promoted, m)
+                        for rep in promoted:
+                            if id(rep) in screened[m]:
+                                screened[m].discard(id(rep))
+                                c["prefiltered"] -= 1
+                                c["classified"] -= 1
+                                yield from _route(m, rep, to_classify)
+                            elif id(rep) in emitted[m]:
+                                yield ("alternate", m, rep)
+                    yield ("progress", m, dict(c))
+                if classify_batch is not None:
+                    for i in range(0, len(to_classify), batch_size):
+                        chunk = to_classify[i:i + batch_size]
+                        pending[llm_pool.submit(classify_batch, [a for _, a, _ in chunk])] = (
+                            "llm", [rid for rid, _, _ in chunk])
+                else:
+                    for rid, rep, m in to_classify:
+                        pending[llm_pool.submit(lambda a, m: [classify(a, m)], rep, m)] = ("llm", [rid])
+    finally:
+        # Also reached when the consumer stops early (e.g. a Streamlit rerun)
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+        llm_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,181 @@
+"""Cheap local pre-classifier that runs before the LLM.
+
+Scores each article with a lexicon of regulators/regulatory terms and
+source-domain priors (or an optional trained linear model) and labels
+low-scoring articles as non-regulatory without an API call.
+"""
+import json, math, os, re, sys, urllib.parse, yaml
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from llm import SYSTEM
+from utils import html_to_text, outlet_name
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+INFLECTIONS = ("s", "es", "ed", "d", "ing")
+
+def _term_regex(terms: Iterable[str], flags=0, inflect: bool = False) -> Optional[re.Pattern]:
+    """One alternation over the terms; `word*` is a prefix and, with inflect, `fine` also matches fines/fined."""
+    parts = []
+    for t in sorted(set(terms), key=len, reverse=True):
+        esc = re.escape(t.rstrip("*"))
+        if not t.isascii():
+            parts.append(esc)      # CJK terms have no word boundaries
+        elif t.endswith("*"):
+            parts.append(rf"(?<!\w){esc}\w*")
+        else:
+            suffix = f"(?:{'|'.join(INFLECTIONS)})?" if inflect else ""
+            parts.append(rf"(?<!\w){esc}{suffix}(?!\w)")
+    return re.compile("|".join(parts), flags) if parts else None
+
+def system_authorities(system: str = SYSTEM) -> List[str]:
+    """Authority examples listed on the `authority:` line of the classifier prompt."""
+    for line in system.splitlines():
+        if line.strip().startswith("- authority"):
+            return re.findall(r'"([^"]+)"', line)
+    return []
+
+def source_lexicon(sources_cfg: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """(authorities, regulator domains) derived from config/sources.yaml."""
+    authorities, domains = [], []
+    for queries in (sources_cfg.get("google_news_queries") or {}).values():
+        for q in queries or []:
+            if q.startswith("site:"):
+                domains.append(q[5:])
+                continue
+            words = q.split()
+            if len(words) > 1 and words[0][:1].isupper():
+                authorities.append(words[0])
+    for feeds in (sources_cfg.get("direct_rss") or {}).values():
+        for url in feeds or []:
+            host = urllib.parse.urlsplit(url).hostname or ""
+            domains.append(host[4:] if host.startswith("www.") else host)
+    return authorities, domains
+
+class PreFilter:
+    def __init__(self, cfg: Dict[str, Any], sources_cfg: Dict[str, Any]):
+        self.threshold = float(cfg.get("threshold", 0.25))
+        self.bias = float(cfg.get("bias", 0.0))
+        src_auth, src_domains = source_lexicon(sources_cfg)
+        self.authority_weight = float(cfg.get("authority_weight", 2.0))
+        authorities = set(cfg.get("authorities") or []) | set(system_authorities()) | set(src_auth)
+        self.authority_re = _term_regex(authorities)
+        self.terms = {t.lower(): float(w) for t, w in (cfg.get("terms") or {}).items()}
+        self.term_re = _term_regex(self.terms, re.IGNORECASE, inflect=True)
+        self.prefixes = sorted((t[:-1] for t in self.terms if t.endswith("*")), key=len, reverse=True)
+        self.domains = {d.lower(): float(w) for d, w in (cfg.get("domains") or {}).items()}
+        for d in src_domains:
+            self.domains.setdefault(d.lower(), float(cfg.get("regulator_domain_weight", 2.0)))
+        # Whole words only, so the outlet "FT" does not match "microsoft.com"
+        self.domain_re = _term_regex(self.domains)
+        self.model = None
+        if cfg.get("model_path"):
+            with open(cfg["model_path"], "r", encoding="utf-8") as f:
+                self.model = json.load(f)
+
+    def _term(self, word: str) -> str:
+        """The lexicon entry a term_re match came from."""
+        word = word.lower()
+        if word in self.terms:
+            return word
+        for suffix in INFLECTIONS:
+            if word.endswith(suffix) and word[:-len(suffix)] in self.terms:
+                return word[:-len(suffix)]
+        return next((p + "*" for p in self.prefixes if word.startswith(p)), word)
+
+    def _logit(self, a: Dict[str, Any]) -> float:
+        if self.model:
+            weights = self.model.get("weights", {})
+            return self.model.get("bias", 0.0) + sum(weights.get(f, 0.0) for f in features(a))
+        text = f"{html_to_text(a.get('title', ''))} {html_to_text(a.get('summary', ''))}"
+        z = self.bias
+        if self.authority_re and self.authority_re.search(text):
+            z += self.authority_weight
+        if self.term_re:
+            z += sum(self.terms.get(t, 0.0) for t in {self._term(m.group(0)) for m in self.term_re.finditer(text)})
+        if self.domain_re:
+            host = urllib.parse.urlsplit(a.get("link", "")).hostname or ""
+            origin = f"{host} {outlet_name(a)} {a.get('source', '')}".lower()
+            z += sum(self.domains.get(d, 0.0) for d in {m.group(0) for m in self.domain_re.finditer(origin)})
+        return z
+
+    def score(self, a: Dict[str, Any]) -> float:
+        """Probability-like score in [0, 1] that the article is regulatory."""
+        return 1.0 / (1.0 + math.exp(-max(min(self._logit(a), 30), -30)))
+
+    def screen(self, articles: List[Dict[str, Any]], threshold: Optional[float] = None) -> List[Optional[Dict[str, Any]]]:
+        """Return a non-regulatory label for each article that can skip the LLM, else None."""
+        threshold = self.threshold if threshold is None else threshold
+        out = []
+        for a in articles:
+            if threshold <= 0 or a.get("origin") == "direct_rss":
+                out.append(None)
+                continue
+            s = self.score(a)
+            out.append({"is_regulatory": False, "prefiltered": True, "prefilter_score": round(s, 3)}
+                       if s < threshold else None)
+        return out
+
+def load_prefilter(path: str = "config/prefilter.yaml", sources_path: str = "config/sources.yaml") -> PreFilter:
+    # Keyed on the files' mtimes (like app.load_yaml), so edited configs apply without a restart
+    return _load_prefilter(path, sources_path, os.path.getmtime(path), os.path.getmtime(sources_path))
+
+@lru_cache(maxsize=4)
+def _load_prefilter(path: str, sources_path: str, mtime: float, sources_mtime: float) -> PreFilter:
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f) or {}
+    with open(sources_path, "r", encoding="utf-8") as f:
+        sources_cfg = yaml.safe_load(f) or {}
+    return PreFilter(cfg, sources_cfg)
+
+def features(a: Dict[str, Any]) -> List[str]:
+    text = f"{html_to_text(a.get('title', ''))} {html_to_text(a.get('summary', ''))}".lower()
+    feats = set(WORD_RE.findall(text))
+    outlet = outlet_name(a).lower()
+    if outlet:
+        feats.add("src:" + outlet)
+    return sorted(feats)
+
+def train_linear(examples: List[Tuple[Dict[str, Any], bool]], epochs: int = 10,
+                 lr: float = 0.1, l2: float = 1e-4) -> Dict[str, Any]:
+    """Fit a logistic-regression model over bag-of-words features with plain SGD."""
+    weights: Dict[str, float] = {}
+    bias = 0.0
+    data = [(features(a), 1.0 if y else 0.0) for a, y in examples]
+    for _ in range(epochs):
+        for feats, y in data:
+            z = bias + sum(weights.get(f, 0.0) for f in feats)
+            g = 1.0 / (1.0 + math.exp(-max(min(z, 30), -30))) - y
+            bias -= lr * g
+            for f in feats:
+                w = weights.get(f, 0.0)
+                weights[f] = w - lr * (g + l2 * w)
+    return {"bias": bias, "weights": {f: round(w, 4) for f, w in weights.items() if abs(w) > 1e-3}}
+
+def evaluate(pf: PreFilter, examples: List[Tuple[Dict[str, Any], bool]]) -> Dict[str, Any]:
+    """How many articles the pre-filter would skip, and which regulatory ones it would wrongly skip."""
+    labels = pf.screen([a for a, _ in examples])
+    skipped = [(a, y) for (a, y), label in zip(examples, labels) if label]
+    return {"articles": len(examples), "skipped": len(skipped),
+            "non_regulatory": sum(1 for _, y in examples if not y),
+            "missed": [a.get("title", "") for a, y in skipped if y]}
+
+if __name__ == "__main__":
+    # python prefilter.py train labelled.jsonl model.json
+    # python prefilter.py eval labelled.jsonl     (scores config/prefilter.yaml against the labels)
+    # Each JSONL line: {"title": ..., "summary": ..., "is_regulatory": true|false}
+    if not (len(sys.argv) == 4 and sys.argv[1] == "train" or len(sys.argv) == 3 and sys.argv[1] == "eval"):
+        sys.exit("usage: python prefilter.py train labelled.jsonl model.json | eval labelled.jsonl")
+    with open(sys.argv[2], "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    if sys.argv[1] == "eval":
+        r = evaluate(load_prefilter(), [(row, bool(row.get("is_regulatory"))) for row in rows])
+        print(f"Skipped {r['skipped']} of {r['articles']} articles ({r['non_regulatory']} labelled non-regulatory); "
+              f"{len(r['missed'])} regulatory articles skipped")
+        for title in r["missed"]:
+            print("  missed:", title)
+        sys.exit(1 if r["missed"] else 0)
+    model = train_linear([(r, bool(r.get("is_regulatory"))) for r in rows])
+    with open(sys.argv[3], "w", encoding="utf-8") as f:
+        json.dump(model, f, ensure_ascii=False, indent=2)
+    print(f"Trained on {len(rows)} articles, {len(model['weights'])} features -> {sys.argv[3]}")
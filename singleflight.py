@@ -0,0 +1,122 @@
+"""Process-wide single-flight: concurrent callers of the same key share one in-progress call.
+
+Streamlit serves every session from the same process, so two sessions (or a
+double click) asking for the same feed or classification at once wait on the
+first request instead of repeating it. Followers receive a deep copy of the
+leader's result, since callers annotate what they get back.
+
+With file locks (on by default where fcntl exists) the leader also holds an
+flock on .cache/locks/, which extends the guarantee to several server or
+ingest processes: a process that waited on the lock rechecks the shared cache
+before doing the work itself. Batched LLM calls lock all of a batch's keys
+(file_locks) the same way. Lock files are striped by key prefix, so two
+unrelated keys may occasionally wait on each other.
+"""
+import copy, os, threading
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from utils import CACHE_DIR, _key
+
+try:
+    import fcntl
+except ImportError:         # Windows: in-process single-flight only
+    fcntl = None
+
+LOCK_DIR = os.path.join(CACHE_DIR, "locks")
+FILE_LOCKS = fcntl is not None and os.environ.get("SINGLEFLIGHT_FILE_LOCKS", "1") == "1"
+LOCK_STRIPES = 3            # hex digits of the key hash -> 4096 lock files
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.stats = {"leader": 0, "shared": 0, "rechecked": 0}
+
+    def begin(self, key: str) -> Tuple[_Call, bool]:
+        """Join the call for key; (call, True) means the caller leads and must finish() it."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats["shared"] += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            self.stats["leader"] += 1
+            return call, True
+
+    def finish(self, key: str, call: _Call, result: Any = None, error: Optional[BaseException] = None):
+        with self._lock:
+            self._calls.pop(key, None)
+            # Snapshot before the leader goes on to mutate its own result
+            call.result = copy.deepcopy(result) if call.waiters else None
+            call.error = error
+        call.done.set()
+
+    def rechecked(self, n: int = 1):
+        """Count results found by a recheck after waiting on the file lock."""
+        with self._lock:
+            self.stats["rechecked"] += n
+
+    @staticmethod
+    def wait(call: _Call) -> Any:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return copy.deepcopy(call.result)
+
+    def do(self, key: str, fn: Callable[[], Any], recheck: Optional[Callable[[], Any]] = None) -> Any:
+        """fn() once per key at a time; recheck() (e.g. a cache read) may supply the result
+        after the cross-process lock is acquired."""
+        call, leader = self.begin(key)
+        if not leader:
+            return self.wait(call)
+        try:
+            with file_lock(key):
+                result = recheck() if recheck is not None else None
+                if result is not None:
+                    self.rechecked()
+                else:
+                    result = fn()
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result)
+        return result
+
+def _lock_path(key: str) -> str:
+    return os.path.join(LOCK_DIR, _key(key)[:LOCK_STRIPES] + ".lock")
+
+def file_lock(key: str):
+    """Exclusive flock shared by every process using this checkout; a no-op when disabled."""
+    return file_locks([key])
+
+@contextmanager
+def file_locks(keys: Iterable[str]):
+    """file_lock for several keys at once (e.g. one LLM batch).
+
+    Each lock file is taken once and in sorted order, so callers locking
+    overlapping sets cannot deadlock. Do not wait on another flight while holding them.
+    """
+    if not FILE_LOCKS:
+        yield
+        return
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    with ExitStack() as stack:
+        for path in sorted({_lock_path(k) for k in keys}):
+            f = stack.enter_context(open(path, "a"))     # closing the file releases its flock
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+_flights = SingleFlight()
+
+def get_flights() -> SingleFlight:
+    return _flights
@@ -0,0 +1,239 @@
+"""Persistent SQLite article store written by ingest.py and read by the dashboard."""
+import json, os, sqlite3, threading, time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from canonical import article_id
+from utils import html_to_text, parse_timestamp
+
+STORE_PATH = os.environ.get("ARTICLE_STORE", os.path.join(os.path.dirname(__file__), "data", "articles.sqlite3"))
+
+ARTICLE_FIELDS = ("title", "link", "canonical_url", "summary", "source", "published", "feed_url", "origin")
+FTS_WEIGHTS = (5.0, 1.0, 1.0, 3.0, 3.0, 2.0)    # title, summary, source, topic, authority, tags
+
+def _fts_term(term: str) -> str:
+    """One FTS5 query term: `"a b"` or multi-word -> phrase, trailing `*` -> prefix, else exact token."""
+    term = term.strip()
+    prefix = term.endswith("*")
+    term = term.strip('*"').strip()
+    if not term:
+        return ""
+    quoted = '"' + term.replace('"', '""') + '"'
+    return quoted + "*" if prefix else quoted
+
+def fts_query(groups: List[List[str]]) -> str:
+    """OR together every synonym of every keyword; bm25 ranks articles matching more terms higher."""
+    terms = [t for group in groups for t in map(_fts_term, group) if t]
+    return " OR ".join(dict.fromkeys(terms))
+
+class ArticleStore:
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS articles (
+                article_id TEXT PRIMARY KEY,
+                title TEXT, link TEXT, canonical_url TEXT, summary TEXT, source TEXT,
+                published TEXT, feed_url TEXT, origin TEXT,
+                alternates TEXT,
+                published_ts REAL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS article_markets (
+                article_id TEXT NOT NULL,
+                market TEXT NOT NULL,
+                PRIMARY KEY (market, article_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS classifications (
+                article_id TEXT NOT NULL,
+                model TEXT NOT NULL,
+                classifier_version TEXT NOT NULL,
+                data TEXT NOT NULL,
+                classified_at REAL NOT NULL,
+                PRIMARY KEY (article_id, model)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS articles_first_seen ON articles (first_seen);
+            CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5 (
+                title, summary, source, topic, authority, tags,
+                tokenize = 'unicode61 remove_diacritics 2'
+            );
+        """)
+        conn = self._conn()
+        if "published_ts" not in {r[1] for r in conn.execute("PRAGMA table_info(articles)")}:
+            conn.execute("ALTER TABLE articles ADD COLUMN published_ts REAL")
+            self._write([("UPDATE articles SET published_ts = ? WHERE article_id = ?",
+                          [(parse_timestamp(p), aid) for aid, p in conn.execute("SELECT article_id, published FROM articles")])])
+        conn.execute("CREATE INDEX IF NOT EXISTS articles_published_ts ON articles (published_ts)")
+        if (conn.execute("SELECT COUNT(*) FROM articles_fts").fetchone()[0] == 0
+                and conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0] > 0):
+            self._reindex([r[0] for r in conn.execute("SELECT article_id FROM articles")])
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, sql_and_rows: Iterable[Tuple[str, List[tuple]]]):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, rows in sql_and_rows:
+                if rows:
+                    conn.executemany(sql, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def upsert_articles(self, market: str, articles: List[Dict[str, Any]]):
+        now = time.time()
+        rows, links = [], []
+        for a in articles:
+            aid = article_id(a)
+            ts = a["published_ts"] if "published_ts" in a else parse_timestamp(a.get("published", ""))
+            rows.append((aid, *(a.get(f, "") or "" for f in ARTICLE_FIELDS),
+                         json.dumps(a.get("alternates") or [], ensure_ascii=False), ts, now, now))
+            links.append((aid, market))
+        self._write([
+            (f"""INSERT INTO articles (article_id, {', '.join(ARTICLE_FIELDS)}, alternates, published_ts, first_seen, last_seen)
+                 VALUES ({', '.join('?' * (len(ARTICLE_FIELDS) + 5))})
+                 ON CONFLICT (article_id) DO UPDATE SET
+                     summary = excluded.summary, alternates = excluded.alternates, last_seen = excluded.last_seen""",
+             rows),
+            ("INSERT OR IGNORE INTO article_markets VALUES (?, ?)", links),
+        ])
+        self._reindex([aid for aid, _ in links])
+
+    def _reindex(self, ids: List[str]):
+        """Refresh the full-text rows (keyed by articles.rowid) from the article and its latest classification."""
+        conn = self._conn()
+        rows = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows += conn.execute(f"""
+                SELECT a.rowid, a.title, a.summary, a.source,
+                       (SELECT data FROM classifications c WHERE c.article_id = a.article_id
+                        ORDER BY classified_at DESC LIMIT 1)
+                FROM articles a WHERE a.article_id IN ({','.join('?' * len(chunk))})
+            """, chunk).fetchall()
+        docs = []
+        for rowid, title, summary, source, data in rows:
+            llm = json.loads(data) if data else {}
+            tags = llm.get("risk_tags")
+            docs.append((rowid, title or "", html_to_text(summary), source or "",
+                         str(llm.get("topic") or ""), str(llm.get("authority") or ""),
+                         " ".join(map(str, tags)) if isinstance(tags, list) else ""))
+        self._write([
+            ("DELETE FROM articles_fts WHERE rowid = ?", [(d[0],) for d in docs]),
+            ("INSERT INTO articles_fts (rowid, title, summary, source, topic, authority, tags) VALUES (?, ?, ?, ?, ?, ?, ?)", docs),
+        ])
+
+    def classified_ids(self, ids: List[str], model: str, classifier_version: str) -> set:
+        out = set()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            out.update(r[0] for r in self._conn().execute(
+                f"""SELECT article_id FROM classifications
+                    WHERE model = ? AND classifier_version = ? AND article_id IN ({','.join('?' * len(chunk))})""",
+                [model, classifier_version, *chunk]))
+        return out
+
+    def save_classifications(self, results: List[Tuple[str, Dict[str, Any]]], model: str, classifier_version: str):
+        now = time.time()
+        rows = [(aid, model, classifier_version, json.dumps(data, ensure_ascii=False), now)
+                for aid, data in results if not data.get("error")]
+        self._write([("INSERT OR REPLACE INTO classifications VALUES (?, ?, ?, ?, ?)", rows)])
+        self._reindex([r[0] for r in rows])
+
+    def _select(self, where: str, params: List[Any], model: Optional[str],
+                fts: bool = False, limit: Optional[int] = None):
+        sql = f"""
+            SELECT a.article_id, {', '.join('a.' + f for f in ARTICLE_FIELDS)}, a.published_ts, a.alternates, c.data
+            FROM {'articles_fts JOIN articles a ON a.rowid = articles_fts.rowid JOIN' if fts else 'articles a CROSS JOIN'}
+                 article_markets m ON m.article_id = a.article_id
+            LEFT JOIN classifications c ON c.article_id = a.article_id AND c.model = ?
+            WHERE {where}
+            ORDER BY {f'bm25(articles_fts, {", ".join(map(str, FTS_WEIGHTS))})' if fts else 'a.published_ts DESC'}
+        """
+        # Without FTS, CROSS JOIN keeps articles as the outer loop so newest-first walks the
+        # published_ts index and stops at the limit instead of sorting every row of the market
+        params = [model, *params]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        out = []
+        for row in self._conn().execute(sql, params):
+            a = dict(zip(("article_id", *ARTICLE_FIELDS, "published_ts"), row[:len(ARTICLE_FIELDS) + 2]))
+            a["alternates"] = json.loads(row[-2] or "[]")
+            out.append((a, json.loads(row[-1]) if row[-1] else None))
+        return out
+
+    @staticmethod
+    def _where(market: str, since: Optional[float], until: Optional[float]) -> Tuple[str, List[Any]]:
+        where, params = "m.market = ?", [market]
+        if since is not None:
+            where += " AND a.published_ts >= ?"
+            params.append(since)
+        if until is not None:
+            where += " AND a.published_ts < ?"
+            params.append(until)
+        return where, params
+
+    def load(self, market: str, model: Optional[str] = None, limit: Optional[int] = None,
+             since: Optional[float] = None, until: Optional[float] = None
+             ) -> List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """(article, classification) pairs for a market, newest first (undated last); since/until are UTC epoch bounds."""
+        where, params = self._where(market, since, until)
+        return self._select(where, params, model, limit=limit)
+
+    def search(self, market: str, groups: List[List[str]], model: Optional[str] = None,
+               limit: Optional[int] = None, since: Optional[float] = None, until: Optional[float] = None
+               ) -> List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """Full-text search over title, summary, source and LLM topic/authority/tags, best match first.
+
+        `groups` holds one list of synonyms per keyword; terms may be phrases
+        (multi-word or quoted) or prefixes (`crypt*`).
+        """
+        query = fts_query(groups)
+        if not query:
+            return self.load(market, model, limit, since, until)
+        where, params = self._where(market, since, until)
+        return self._select(where + " AND articles_fts MATCH ?", params + [query], model, fts=True, limit=limit)
+
+    def count(self, market: str, groups: Optional[List[List[str]]] = None,
+              since: Optional[float] = None, until: Optional[float] = None) -> int:
+        """How many articles search() (or load(), without groups) would return with no limit."""
+        where, params = self._where(market, since, until)
+        query = fts_query(groups or [])
+        if query:
+            where += " AND articles_fts MATCH ?"
+            params.append(query)
+        sql = f"""
+            SELECT COUNT(*)
+            FROM {'articles_fts JOIN articles a ON a.rowid = articles_fts.rowid JOIN' if query else 'articles a JOIN'}
+                 article_markets m ON m.article_id = a.article_id
+            WHERE {where}
+        """
+        return self._conn().execute(sql, params).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        return {
+            "articles": conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0],
+            "classified": conn.execute("SELECT COUNT(DISTINCT article_id) FROM classifications").fetchone()[0],
+            "last_seen": conn.execute("SELECT MAX(last_seen) FROM articles").fetchone()[0],
+        }
+
+_store: Optional[ArticleStore] = None
+_store_lock = threading.Lock()
+
+def get_store() -> ArticleStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArticleStore()
+        return _store
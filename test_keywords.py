@@ -0,0 +1,41 @@
+from keywords import KeywordMatcher
+
+def _keywords(matcher, text):
+    return [kw for _, _, kw in matcher.scan(text)]
+
+def test_ascii_terms_respect_word_boundaries():
+    m = KeywordMatcher({"esg": "esg"})
+    assert _keywords(m, "ESG rules tighten") == ["esg"]
+    assert _keywords(m, "new ESG-linked bonds") == ["esg"]
+    assert _keywords(m, "esgrima championship") == []
+    assert _keywords(m, "the fesg fund") == []
+
+def test_prefix_terms_extend_to_the_end_of_the_word():
+    m = KeywordMatcher({"crypt*": "crypto"})
+    assert m.scan("Cryptocurrency rules") == [(0, 14, "crypto")]
+    assert _keywords(m, "encrypted messages") == []
+
+def test_cjk_terms_match_inside_running_text():
+    m = KeywordMatcher({"金融庁": "jfsa", "規制": "regulation"})
+    text = "金融庁が暗号資産の規制を強化"
+    assert _keywords(m, text) == ["jfsa", "regulation"]
+    start, end, _ = m.scan(text)[1]
+    assert text[start:end] == "規制"
+
+def test_longest_match_wins_and_spans_do_not_overlap():
+    m = KeywordMatcher({"climate": "climate", "climate risk": "climate risk", "risk": "risk"})
+    assert m.scan("climate risk disclosure") == [(0, 12, "climate risk")]
+
+def test_match_article_keeps_regulator_link_text():
+    m = KeywordMatcher({"15c3-3": "customer protection"})
+    a = {"title": "SEC adopts amendments",
+         "summary": 'The SEC adopted <a href="https://sec.gov/r">amendments to Rule 15c3-3</a> today',
+         "origin": "direct_rss"}
+    assert m.match_article(a)["summary"] and a["matched_keywords"] == ["customer protection"]
+    g = {"title": "Rule change - Reuters", "summary": '<a href="x">Rule 15c3-3</a>&nbsp;<font>Reuters</font>',
+         "origin": "google_news"}
+    assert m.match_article(g)["summary"] == []
+
+def test_highlight_escapes_text_around_marks():
+    m = KeywordMatcher({"sec": "sec"})
+    assert m.highlight("<b>SEC</b> & co") == "&lt;b&gt;<mark>SEC</mark>&lt;/b&gt; &amp; co"
@@ -0,0 +1,162 @@
+import http.server, multiprocessing, os, threading, time
+import pytest
+import llm, singleflight
+from singleflight import SingleFlight, file_locks, _lock_path
+from utils import cache_get, cache_set, cache_set_many
+
+needs_flock = pytest.mark.skipif(not singleflight.FILE_LOCKS, reason="file locks disabled or no fcntl")
+
+def _run_threads(n, target):
+    out = [None] * n
+    def run(i):
+        out[i] = target()
+    threads = [threading.Thread(target=run, args=(i,), daemon=True) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert not any(t.is_alive() for t in threads), "deadlocked"
+    return out
+
+def test_followers_share_one_call_and_get_their_own_copy():
+    sf, calls = SingleFlight(), []
+    def fn():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"items": [1, 2]}
+    results = _run_threads(6, lambda: sf.do("k", fn))
+    assert len(calls) == 1
+    assert results == [{"items": [1, 2]}] * 6
+    results[0]["items"].append(3)
+    assert all(r == {"items": [1, 2]} for r in results[1:])
+
+def test_leader_error_reaches_followers_and_is_not_remembered():
+    sf = SingleFlight()
+    def fail():
+        time.sleep(0.2)
+        raise ValueError("boom")
+    def call():
+        try:
+            sf.do("k", fail)
+        except ValueError as e:
+            return str(e)
+    assert _run_threads(4, call) == ["boom"] * 4
+    assert sf.do("k", lambda: "ok") == "ok"
+
+class _SlowFeed(http.server.BaseHTTPRequestHandler):
+    hits = 0
+    def do_GET(self):
+        type(self).hits += 1
+        time.sleep(0.3)
+        body = (b"<?xml version='1.0'?><rss version='2.0'><channel><title>t</title>"
+                b"<item><title>Rule</title><link>https://example.com/1</link></item></channel></rss>")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/rss+xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, *args):
+        pass
+
+def test_six_threads_fetching_one_feed_make_one_request():
+    import fetch
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _SlowFeed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/feed"
+        results = _run_threads(6, lambda: fetch.fetch_feed(url))
+    finally:
+        server.shutdown()
+    assert _SlowFeed.hits == 1
+    assert [len(r) for r in results] == [1] * 6
+
+@needs_flock
+def test_overlapping_lock_sets_do_not_deadlock():
+    keys = [f"k{i}" for i in range(60)]
+    orders = [keys[:40], keys[20:][::-1], keys[::-1], keys[10:50]]
+    def lock():
+        order = orders.pop()
+        for _ in range(20):
+            with file_locks(order):
+                pass
+        return True
+    assert _run_threads(4, lock) == [True] * 4
+
+@needs_flock
+def test_keys_sharing_a_stripe_are_locked_once():
+    first = _lock_path("a")
+    other = next(f"b{i}" for i in range(100000) if _lock_path(f"b{i}") == first)
+    def lock():
+        with file_locks(["a", other, "a"]):     # a second flock on the stripe would block forever
+            return True
+    assert _run_threads(1, lock) == [True]
+
+def _fake_batch(sent_log):
+    def classify(batch, model):
+        with open(sent_log, "a") as f:
+            f.write("".join(k + "\n" for k, _ in batch))
+        time.sleep(0.2)
+        return {k: {"is_regulatory": True, "summary": a["title"]} for k, a in batch}
+    return classify
+
+def _articles(n, tag):
+    return [{"title": f"{tag} {i}", "link": f"https://example.com/{tag}/{i}", "summary": ""} for i in range(n)]
+
+def _sent(path):
+    with open(path) as f:
+        return f.read().split()
+
+def test_overlapping_batches_send_each_article_once(tmp_path, monkeypatch):
+    log = str(tmp_path / "sent")
+    monkeypatch.setattr(llm, "_classify_batch", _fake_batch(log))
+    articles = _articles(12, "overlap")
+    runs = [articles[:8], articles[4:], articles[2:10]]
+    out = _run_threads(3, lambda: llm.analyse_batch(runs.pop(), "m", batch_size=4, max_workers=2))
+    assert sorted(_sent(log)) == sorted({llm._cache_key(a, "m") for a in articles})
+    assert all(r["is_regulatory"] for res in out for r in res)
+
+@needs_flock
+def test_batch_rechecks_the_cache_after_waiting_on_its_locks(tmp_path, monkeypatch):
+    log = str(tmp_path / "sent")
+    monkeypatch.setattr(llm, "_classify_batch", _fake_batch(log))
+    batch = [(llm._cache_key(a, "m"), a) for a in _articles(6, "recheck")]
+    keys = ["llm|" + k for k, _ in batch]
+    out = {}
+    with file_locks(keys):
+        worker = threading.Thread(target=lambda: out.update(llm._classify_batch_locked(batch, "m")))
+        worker.start()
+        time.sleep(0.3)
+        # another process classified half of the batch while this one waited
+        cache_set_many({k: {"is_regulatory": False} for k, _ in batch[:3]}, namespace="llm")
+    worker.join(10)
+    assert sorted(_sent(log)) == sorted(k for k, _ in batch[3:])
+    assert len(out) == 6 and cache_get(batch[5][0], namespace="llm")["is_regulatory"]
+
+def _process_batch(args):
+    log, tag = args
+    llm._classify_batch = _fake_batch(log)
+    return len(llm.analyse_batch(_articles(16, tag), "m", batch_size=4, max_workers=2))
+
+@needs_flock
+def test_processes_classify_a_shared_batch_once(tmp_path):
+    log, tag = str(tmp_path / "sent"), f"procs-{os.getpid()}"
+    with multiprocessing.get_context("spawn").Pool(3) as pool:
+        assert pool.map(_process_batch, [(log, tag)] * 3) == [16] * 3
+    assert len(_sent(log)) == 16
+
+def _process_flight(args):
+    log, key = args
+    def fn():
+        with open(log, "a") as f:
+            f.write("call\n")
+        time.sleep(0.3)
+        cache_set(key, "done", namespace="test")
+        return "done"
+    return SingleFlight().do(key, fn, recheck=lambda: cache_get(key, namespace="test"))
+
+@needs_flock
+def test_processes_share_one_flight_through_the_file_lock(tmp_path):
+    log, key = str(tmp_path / "calls"), f"flight-{os.getpid()}"
+    with multiprocessing.get_context("spawn").Pool(3) as pool:
+        assert pool.map(_process_flight, [(log, key)] * 3) == ["done"] * 3
+    assert _sent(log) == ["call"]
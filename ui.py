@@ -1,6 +1,7 @@
+import html, math, perf
 import streamlit as st
-from typing import List, Dict, Any, Optional
-import re
+from typing import List, Dict, Any, Optional, Tuple
+from utils import plain_text, summary_text
 
 FLAGS = {
     "US": "🇺🇸",
@@ -10,122 +11,166 @@ FLAGS = {
     "JP": "🇯🇵"
 }
 
-def article_card(a: Dict[str, Any], llm: Optional[Dict[str, Any]] = None):
-    def clean_html(text: str) -> str:
-        text = re.sub(r'<a[^>]*>.*?</a>', '', text, flags=re.DOTALL)
-        text = re.sub(r'<font[^>]*>.*?</font>', '', text, flags=re.DOTALL)
-
-        text = re.sub(r'<.*?>', '', text)
-        return text.strip()
-    
-    raw_title = a.get("title", "(no title)")
-    clean_title = clean_html(raw_title)
-    link = a.get('link', '')
-    
-    raw_source = a.get("source", "")
-    clean_source = clean_html(raw_source)
-    published = a.get('published', '')
-
-    raw_summary = a.get("summary", "") or ""
-    clean_summary = clean_html(raw_summary)
-
-    with st.container():
-        st.markdown(
-            """
-            <style>
-            .article-container {
-                max-width: 1150px;
-                margin: 15px auto;
-                padding: 3px 10px; 
-                background-color: #f9f9f9;
-                border: 1px solid #ddd;
-                border-radius: 8px;
-                box-shadow: 0 1px 3px rgba(0, 0, 0, 0.04);
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                line-height: 1.4;
-                color: #222;
-            }
-            .article-title {
-                font-weight: 700;
-                font-size: 1.6rem;
-                margin-bottom: 0.4rem;
-                text-align: center;
-            }
-            .article-meta {
-                font-style: italic;
-                font-size: 0.85rem;
-                color: #555;
-                margin-bottom: 0.3rem;
-                text-align: left; 
-            }
-            .article-summary {
-                margin-top: -0.4em;
-                margin-bottom: 0.8em;
-                font-size: 1rem;
-                color: #333;
-            }
-            .divider {
-                border-top: 1px solid #ddd;
-                margin: 0.3em 0;
-            }
-            .metrics-row {
-                display: flex;
-                justify-content: space-around;
-                font-size: 0.95rem;
-                margin-bottom: 0.4em;
-                font-weight: 600;
-                color: #444;
-            }
-            .metrics-row div {
-                flex: 1;
-                text-align: center;
-            }
-            .llm-text {
-                margin-top: 0.1em;
-                font-size: 0.95rem;
-                color: #333;
-                line-height: 1.3;
-            }
-            </style>
-            """,
-            unsafe_allow_html=True
+CARD_CSS = """
+<style>
+.article-container {
+    max-width: 1150px;
+    margin: 15px auto;
+    padding: 3px 10px;
+    background-color: #f9f9f9;
+    border: 1px solid #ddd;
+    border-radius: 8px;
+    box-shadow: 0 1px 3px rgba(0, 0, 0, 0.04);
+    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+    line-height: 1.4;
+    color: #222;
+}
+.article-title {
+    display: block;
+    font-weight: 700;
+    font-size: 1.6rem;
+    margin-bottom: 0.4rem;
+    text-align: center;
+}
+.article-meta {
+    font-style: italic;
+    font-size: 0.85rem;
+    color: #555;
+    margin-bottom: 0.3rem;
+    text-align: left;
+}
+.article-summary {
+    margin-top: -0.4em;
+    margin-bottom: 0.8em;
+    font-size: 1rem;
+    color: #333;
+}
+.divider {
+    border-top: 1px solid #ddd;
+    margin: 0.3em 0;
+}
+.metrics-row {
+    display: flex;
+    justify-content: space-around;
+    font-size: 0.95rem;
+    margin-bottom: 0.4em;
+    font-weight: 600;
+    color: #444;
+}
+.metrics-row div {
+    flex: 1;
+    text-align: center;
+}
+.llm-text {
+    margin-top: 0.1em;
+    font-size: 0.95rem;
+    color: #333;
+    line-height: 1.3;
+}
+</style>
+"""
+
+Item = Tuple[Dict[str, Any], Optional[Dict[str, Any]]]
+
+def inject_card_css():
+    """Emit the card stylesheet; call once per script run, before any cards."""
+    st.markdown(CARD_CSS, unsafe_allow_html=True)
+
+def _text(value: Any) -> str:
+    # LLM output is plain text: escape it and keep it on one line so the HTML block is not split
+    return " ".join(html.escape(str(value), quote=False).split())
+
+def _href(url: str) -> str:
+    return html.escape(url or "", quote=True)
+
+def card_html(a: Dict[str, Any], llm: Optional[Dict[str, Any]] = None, highlighter=None) -> str:
+    """One article card as a self-contained HTML fragment (styled by CARD_CSS)."""
+    # Feed text is untrusted: reduced to plain text, then escaped (highlight() escapes too)
+    clean_title = plain_text(a.get("title", "(no title)"))
+    clean_source = html.escape(plain_text(a.get("source", "")), quote=False)
+    published = html.escape(plain_text(a.get("published", "")), quote=False)
+    clean_summary = summary_text(a)     # the text keyword_spans were computed on
+
+    # Reuse the spans from the keyword filter's scan when present
+    if highlighter is not None:
+        spans = a.get("keyword_spans") or {}
+        clean_title = highlighter.highlight(clean_title, spans.get("title"))
+        clean_summary = highlighter.highlight(clean_summary, spans.get("summary"))
+    else:
+        clean_title = html.escape(clean_title, quote=False)
+        clean_summary = html.escape(clean_summary, quote=False)
+
+    parts = ["<div class='article-container'>",
+             f"<a href='{_href(a.get('link', ''))}' target='_blank' rel='noopener noreferrer' class='article-title'>{clean_title}</a>"]
+    if clean_source or published:
+        meta_text = f"{clean_source} — {published}".strip(" —")
+        parts.append(f"<div class='article-meta'>{meta_text}</div>")
+    parts.append(f"<div class='article-summary'>{clean_summary}</div>")
+    alternates = a.get("alternates") or []
+    if alternates:
+        links = ", ".join(
+            f"<a href='{_href(alt.get('link', ''))}' target='_blank' rel='noopener noreferrer'>{html.escape(plain_text(alt.get('source', '') or 'link'), quote=False)}</a>"
+            for alt in alternates
         )
+        parts.append(f"<div class='article-meta'>Also reported by ({len(alternates)}): {links}</div>")
+    parts.append("<div class='divider'></div>")
+
+    if llm:
+        is_reg = llm.get("is_regulatory")
+        reg_icon = "✅" if is_reg else "❌"
+        jurisdiction = str(llm.get('jurisdiction', '-')).upper()
+        flag = FLAGS.get(jurisdiction, '')
+        topic = llm.get('topic', '-')
+        summary_llm = llm.get('summary', '')
+        implications = llm.get('implications', '')
+        tags = llm.get("risk_tags") or []
+
+        parts.append(
+            "<div class='metrics-row'>"
+            f"<div>Regulatory? {reg_icon}</div>"
+            f"<div>Jurisdiction: {flag} {_text(jurisdiction)}</div>"
+            f"<div>Authority: {_text(llm.get('authority', '-'))}</div>"
+            "</div>"
+        )
+        if is_reg or any([topic, summary_llm, implications, tags]):
+            if topic:
+                parts.append(f"<div class='llm-text'><strong>Topic:</strong> {_text(topic)}</div>")
+            if summary_llm:
+                parts.append(f"<div class='llm-text'><strong>Summary (LLM):</strong> {_text(summary_llm)}</div>")
+            if implications:
+                parts.append(f"<div class='llm-text'><strong>Implications:</strong> {_text(implications)}</div>")
+            if isinstance(tags, list) and tags:
+                parts.append(f"<div class='llm-text'><strong>Risk tags:</strong> {_text(', '.join(map(str, tags)))}</div>")
+        else:
+            parts.append("<div class='llm-text' style='color:#777;font-style:italic;'>No regulatory content detected.</div>")
+
+    parts.append("</div>")
+    # A blank line would end the markdown HTML block, so the fragment is kept on one line
+    return "".join(parts).replace("\n", " ")
+
+def article_card(a: Dict[str, Any], llm: Optional[Dict[str, Any]] = None, highlighter=None):
+    """Render a single card (one Streamlit element); expects inject_card_css() earlier in the run."""
+    with perf.timer("render", cards=1):
+        st.markdown(card_html(a, llm, highlighter), unsafe_allow_html=True)
+
+def render_cards(items: List[Item], highlighter=None, target=None):
+    """Render a batch of cards as one Streamlit element."""
+    with perf.timer("render", cards=len(items)):
+        (target or st).markdown("".join(card_html(a, llm, highlighter) for a, llm in items), unsafe_allow_html=True)
+
+def render_card_pages(items: List[Item], key: str, page_size: int = 10, highlighter=None):
+    """Paginated cards: only the selected page is built and sent, so reruns stay flat as the list grows.
 
-        st.markdown(f"<div class='article-container'>", unsafe_allow_html=True)
-        st.markdown(f"<a href='{link}' target='_blank' rel='noopener noreferrer' class='article-title'>{clean_title}</a>", unsafe_allow_html=True)
-        if clean_source or published:
-            meta_text = f"{clean_source} — {published}".strip(" —")
-            st.markdown(f"<div class='article-meta'>{meta_text}</div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='article-summary'>{clean_summary}</div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='divider'></div>", unsafe_allow_html=True)
-
-        if llm:
-            is_reg = llm.get("is_regulatory")
-            reg_icon = "✅" if is_reg else "❌"
-            jurisdiction = llm.get('jurisdiction','-').upper()
-            flag = FLAGS.get(jurisdiction, '')
-            authority = llm.get('authority','-')
-            topic = llm.get('topic','-')
-            summary_llm = llm.get('summary','')
-            implications = llm.get('implications','')
-            tags = llm.get("risk_tags") or []
-
-            st.markdown("<div class='metrics-row'>", unsafe_allow_html=True)
-            st.markdown(f"<div>Regulatory? {reg_icon}</div>", unsafe_allow_html=True)
-            st.markdown(f"<div>Jurisdiction: {flag} {jurisdiction if jurisdiction != '-' else '-'}</div>", unsafe_allow_html=True)
-            st.markdown(f"<div>Authority: {authority}</div>", unsafe_allow_html=True)
-            st.markdown("</div>", unsafe_allow_html=True)
-
-            if is_reg or any([topic, summary_llm, implications, tags]):
-                if topic:
-                    st.markdown(f"<div class='llm-text'><strong>Topic:</strong> {topic}</div>", unsafe_allow_html=True)
-                if summary_llm:
-                    st.markdown(f"<div class='llm-text'><strong>Summary (LLM):</strong> {summary_llm}</div>", unsafe_allow_html=True)
-                if implications:
-                    st.markdown(f"<div class='llm-text'><strong>Implications:</strong> {implications}</div>", unsafe_allow_html=True)
-                if isinstance(tags, list) and tags:
-                    st.markdown(f"<div class='llm-text'><strong>Risk tags:</strong> {', '.join(tags)}</div>", unsafe_allow_html=True)
-            else:
-                st.markdown(f"<div class='llm-text' style='color:#777;font-style:italic;'>No regulatory content detected.</div>", unsafe_allow_html=True)
-                
-        st.markdown("</div>", unsafe_allow_html=True)
+    The page number lives in st.session_state[key].
+    """
+    if not items:
+        return
+    pages = max(1, math.ceil(len(items) / page_size))
+    if st.session_state.get(key, 1) > pages:      # a new, shorter result set
+        st.session_state[key] = pages
+    start = 0
+    if pages > 1:
+        col, info = st.columns([1, 5])
+        start = (col.number_input("Page", min_value=1, max_value=pages, step=1, key=key) - 1) * page_size
+        info.caption(f"Showing {start + 1}–{min(start + page_size, len(items))} of {len(items)} articles")
+    render_cards(items[start:start + page_size], highlighter)
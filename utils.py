@@ -1,27 +1,311 @@
-import hashlib, os, json, time, re
-from typing import Any, Dict
+import hashlib, html, os, json, perf, time, re, sqlite3, threading, calendar, datetime as dt, email.utils
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
 
-CACHE_DIR = os.path.join(os.path.dirname(__file__), ".cache")
+CACHE_DIR = os.environ.get("CACHE_DIR") or os.path.join(os.path.dirname(__file__), ".cache")
 os.makedirs(CACHE_DIR, exist_ok=True)
+CACHE_DB = os.path.join(CACHE_DIR, "cache.sqlite3")
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
 
 def _key(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
-def cache_get(key: str):
-    fp = os.path.join(CACHE_DIR, key + ".json")
-    if os.path.exists(fp):
+class Cache:
+    """Single-file SQLite key/value store with namespaces, TTL and size-bounded LRU eviction.
+
+    Every write is a transaction, so concurrent Streamlit sessions (or processes)
+    never see a half-written entry.
+    """
+
+    TOUCH_EVERY = 60.0      # seconds; avoids a write on every hit
+    EVICT_EVERY = 50        # writes between size checks
+
+    def __init__(self, path: str = CACHE_DB, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.counters = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                ns TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires REAL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (ns, key)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def get_many(self, keys: Iterable[str], namespace: str = "default") -> Dict[str, Any]:
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        now = time.time()
+        conn = self._conn()
+        found, stale = {}, []
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, value, expires, accessed FROM entries WHERE ns = ? AND key IN ({','.join('?' * len(chunk))})",
+                [namespace, *chunk],
+            ).fetchall()
+            for key, value, expires, accessed in rows:
+                if expires is not None and expires < now:
+                    continue
+                found[key] = json.loads(value)
+                if now - accessed > self.TOUCH_EVERY:
+                    stale.append(key)
+        if stale:
+            conn.executemany("UPDATE entries SET accessed = ? WHERE ns = ? AND key = ?",
+                             [(now, namespace, k) for k in stale])
+        self._count("hits", len(found))
+        self._count("misses", len(keys) - len(found))
+        return found
+
+    def get(self, key: str, namespace: str = "default") -> Any:
+        return self.get_many([key], namespace).get(key)
+
+    def set_many(self, items: Dict[str, Any], namespace: str = "default", ttl: Optional[float] = None):
+        if not items:
+            return
+        now = time.time()
+        expires = now + ttl if ttl else None
+        rows = []
+        for key, value in items.items():
+            blob = json.dumps(value, ensure_ascii=False)
+            rows.append((namespace, key, blob, len(blob), expires, now))
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
         try:
-            with open(fp, "r", encoding="utf-8") as f:
-                return json.load(f)
+            conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
         except Exception:
-            return None
-    return None
+            conn.execute("ROLLBACK")
+            raise
+        self._count("sets", len(rows))
+        with self._lock:
+            self._writes += len(rows)
+            due = self._writes >= self.EVICT_EVERY
+            if due:
+                self._writes = 0
+        if due:
+            self.evict()
+
+    def set(self, key: str, value: Any, namespace: str = "default", ttl: Optional[float] = None):
+        self.set_many({key: value}, namespace, ttl)
+
+    def delete(self, key: str, namespace: str = "default"):
+        self._conn().execute("DELETE FROM entries WHERE ns = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace: Optional[str] = None):
+        if namespace is None:
+            self._conn().execute("DELETE FROM entries")
+        else:
+            self._conn().execute("DELETE FROM entries WHERE ns = ?", (namespace,))
+
+    def evict(self):
+        """Drop expired entries, then least-recently-used ones until under max_bytes."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = conn.execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?",
+                                   (time.time(),)).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                target = total - int(self.max_bytes * 0.9)
+                victims, freed = [], 0
+                for ns, key, size in conn.execute("SELECT ns, key, size FROM entries ORDER BY accessed"):
+                    victims.append((ns, key))
+                    freed += size
+                    if freed >= target:
+                        break
+                conn.executemany("DELETE FROM entries WHERE ns = ? AND key = ?", victims)
+                removed += len(victims)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._count("evictions", removed)
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        with self._lock:
+            out = dict(self.counters)
+        lookups = out["hits"] + out["misses"]
+        out.update(entries=entries, bytes=size, hit_rate=out["hits"] / lookups if lookups else 0.0)
+        return out
+
+_cache: Optional[Cache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> Cache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _remove_legacy_files()
+            _cache = Cache()
+        return _cache
+
+def _remove_legacy_files():
+    # The old one-file-per-key cache (<sha256>.json) cannot match any current key
+    # (LLM entries are keyed by canonical ID and classifier version), so it is dropped
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith(".json") and len(name) == 69 and all(c in "0123456789abcdef" for c in name[:64]):
+            try:
+                os.remove(os.path.join(CACHE_DIR, name))
+            except OSError:
+                pass
+
+def cache_get(key: str, namespace: str = "default"):
+    return get_cache().get(key, namespace)
 
-def cache_set(key: str, value: Any):
-    fp = os.path.join(CACHE_DIR, key + ".json")
-    with open(fp, "w", encoding="utf-8") as f:
-        json.dump(value, f, ensure_ascii=False, indent=2)
+def cache_set(key: str, value: Any, namespace: str = "default", ttl: Optional[float] = None):
+    get_cache().set(key, value, namespace, ttl)
+
+def cache_get_many(keys: Iterable[str], namespace: str = "default") -> Dict[str, Any]:
+    return get_cache().get_many(keys, namespace)
+
+def cache_set_many(items: Dict[str, Any], namespace: str = "default", ttl: Optional[float] = None):
+    get_cache().set_many(items, namespace, ttl)
+
+def cache_stats() -> Dict[str, Any]:
+    return get_cache().stats()
+
+@lru_cache(maxsize=8192)
+def parse_timestamp(s: str) -> Optional[float]:
+    """UTC epoch seconds for a feed date string, or None.
+
+    RFC 822 (RSS) and ISO 8601 (Atom) take a fast path; anything else falls
+    back to dateutil. Naive times are taken as UTC.
+    """
+    s = (s or "").strip()
+    if not s:
+        return None
+    d = None
+    try:
+        d = email.utils.parsedate_to_datetime(s)
+    except (TypeError, ValueError, IndexError):
+        try:
+            d = dt.datetime.fromisoformat(s.replace("Z", "+00:00"))
+        except ValueError:
+            try:
+                from dateutil import parser
+                perf.incr("dateutil_parse")
+                d = parser.parse(s)
+            except (ValueError, OverflowError):
+                return None
+    if d.tzinfo is None:
+        d = d.replace(tzinfo=dt.timezone.utc)
+    return d.timestamp()
+
+def struct_time_to_ts(t) -> Optional[float]:
+    # feedparser normalizes *_parsed fields to UTC
+    return float(calendar.timegm(t)) if t else None
+
+HTML_ANCHOR_RE = re.compile(r'<a[^>]*>.*?</a>', re.DOTALL)
+HTML_FONT_RE = re.compile(r'<font[^>]*>.*?</font>', re.DOTALL)
+HTML_SCRIPT_RE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.DOTALL | re.IGNORECASE)
+HTML_TAG_RE = re.compile(r'<.*?>', re.DOTALL)     # tags may span lines
+GNEWS_SUMMARY_RE = re.compile(r'</a>(?:\s|&nbsp;|\xa0)*<font\b', re.IGNORECASE)
+NON_WORD_RE = re.compile(r'[^\w]+', re.UNICODE)
+
+def strip_html(text: str, google_news: bool = False) -> str:
+    # Google News summaries are "<a>title</a>&nbsp;<font>outlet</font>" (or a list of them) that only
+    # repeat the headline, so their links and outlet tags go entirely. Elsewhere link text is content
+    # ("adopted <a>amendments to Rule 15c3-3</a>"), so only the tags go.
+    # Script/style bodies go too: feedparser's sanitizer drops them, the streaming parser does not.
+    text = HTML_SCRIPT_RE.sub('', text)
+    if google_news or GNEWS_SUMMARY_RE.search(text):
+        text = HTML_ANCHOR_RE.sub('', text)
+        text = HTML_FONT_RE.sub('', text)
+    text = HTML_TAG_RE.sub('', text)
+    return text.strip()
+
+def html_to_text(text: str) -> str:
+    """Tags replaced by spaces and entities decoded, for tokenizing and indexing (anchor text is kept)."""
+    return html.unescape(HTML_TAG_RE.sub(" ", text or ""))
+
+def plain_text(text: str, google_news: bool = False) -> str:
+    """Displayed article text: strip_html plus decoded entities. Not HTML-safe; escape it when rendering."""
+    return html.unescape(strip_html(text or "", google_news))
+
+def summary_text(a: Dict[str, Any]) -> str:
+    """plain_text of an article's summary: what its card shows and the keyword filter scans."""
+    return plain_text(a.get("summary", ""), a.get("origin") == "google_news")
 
 def clean_text(s: str) -> str:
     s = re.sub(r"\s+", " ", s or "").strip()
-    return s[:8000]  
+    return s[:8000]
+
+@lru_cache(maxsize=1)
+def _tokenizer():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+def estimate_tokens(s: str) -> int:
+    """Token count with tiktoken when installed, else the ~4 characters per token rule of thumb."""
+    enc = _tokenizer()
+    if enc is not None:
+        return len(enc.encode(s or "", disallowed_special=()))
+    return (len(s or "") + 3) // 4
+
+def truncate_tokens(s: str, max_tokens: int) -> str:
+    enc = _tokenizer()
+    if enc is not None:
+        toks = enc.encode(s, disallowed_special=())
+        return s if len(toks) <= max_tokens else enc.decode(toks[:max_tokens]).rstrip() + " …"
+    if len(s) <= max_tokens * 4:
+        return s
+    return s[:max_tokens * 4].rsplit(" ", 1)[0] + " …"
+
+URL_RE = re.compile(r"(?:https?://|www\.)\S+")
+BOILERPLATE_RE = re.compile(
+    r"The post .{0,300}? appeared first on [^.]*\.?|View Full Coverage on Google News|"
+    # a trailing "Read more" link: starts a sentence and only a short "at <outlet>" may follow it
+    r"(?:^|(?<=[.!?…\]|:»>\"”)]) ?)(?:Continue reading|Read more|Read the full (?:story|article))\b"
+    r"[^.!?]{0,60}?[\s.…:»›>→-]*$|\[(?:…|\.\.\.)\]",
+    re.IGNORECASE,
+)
+
+def compact_article_text(title: str, summary: str, max_tokens: int = 600,
+                         google_news: bool = False) -> Tuple[str, str]:
+    """(title, text) for an LLM prompt.
+
+    Same markup cleanup as the cards (strip_html), plus entities, URLs and feed
+    boilerplate; a summary that repeats the headline is cut back to what it adds,
+    and the text is truncated to max_tokens.
+    """
+    title = " ".join(HTML_TAG_RE.sub(" ", plain_text(title)).split())
+    text = HTML_TAG_RE.sub(" ", plain_text(summary, google_news))
+    text = " ".join(BOILERPLATE_RE.sub(" ", " ".join(URL_RE.sub(" ", text).split())).split())
+    headline = title.rsplit(" - ", 1)[0] if " - " in title else title
+    if headline and text.lower().startswith(headline.lower()):
+        text = text[len(headline):].lstrip(" .:;-–—|")
+    if text and text.lower() in title.lower():
+        text = ""
+    return title, truncate_tokens(text, max_tokens)
+
+def outlet_name(a: Dict[str, Any]) -> str:
+    # Google News titles end in " - <outlet>"; regulator feeds only carry the feed title
+    title = a.get("title", "") or ""
+    return title.rsplit(" - ", 1)[1].strip() if " - " in title else ""